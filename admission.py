@@ -0,0 +1,119 @@
+# admission.py
+"""Kiểm soát tải cho Flask host: giới hạn hàng đợi, deadline và độ ưu tiên.
+
+Mỗi model có một PriorityGate cho phép tối đa `concurrency` phần việc chạy model cùng lúc.
+Khi có chỗ trống, lượt chờ có độ ưu tiên cao nhất được chạy trước (INTERACTIVE trước BULK),
+nên câu đơn của người dùng không phải xếp sau cả file/batch lớn. Số lượt chờ của mỗi lớp bị
+giới hạn; vượt giới hạn thì trả lỗi ngay (kèm Retry-After) thay vì để request chờ vô hạn.
+"""
+import math
+import time
+import heapq
+import itertools
+import threading
+import contextlib
+
+INTERACTIVE, BULK = 0, 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk"}
+
+
+class Overloaded(Exception):
+    """Hàng đợi đầy: trả `status` (429/503) với header Retry-After."""
+
+    def __init__(self, message, status=503, retry_after=1):
+        super().__init__(message)
+        self.status      = status
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class DeadlineExceeded(Exception):
+    """Deadline của client đã qua trước khi tới lượt suy luận."""
+
+
+def deadline_after(timeout_ms):
+    """Deadline tuyệt đối (time.monotonic) sau `timeout_ms`; None nếu không giới hạn."""
+    return time.monotonic() + timeout_ms / 1000.0 if timeout_ms and timeout_ms > 0 else None
+
+
+def expired(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+class PriorityGate:
+    """Semaphore có độ ưu tiên (số nhỏ hơn = ưu tiên hơn; cùng mức thì đến trước làm trước)."""
+
+    def __init__(self, name, concurrency=1, max_waiting=None):
+        self.name        = name
+        self.concurrency = max(1, int(concurrency))
+        # số lượt chờ tối đa theo lớp ưu tiên; không có trong dict = không giới hạn
+        self.max_waiting = dict(max_waiting or {})
+        self._lock       = threading.Lock()
+        self._heap       = []
+        self._seq        = itertools.count()
+        self._running    = 0
+        self._waiting    = {}
+        self._hold_s     = 0.05   # EWMA thời gian giữ chỗ, dùng để ước lượng Retry-After
+        self.rejected    = {}
+
+    def retry_after(self, ahead=0):
+        return self._hold_s * (ahead + 1) / self.concurrency
+
+    def acquire(self, priority=BULK, deadline=None, admit=True):
+        """Chờ tới lượt; `admit=False` bỏ qua giới hạn hàng đợi (dùng cho job nền đã tự giới hạn)."""
+        if expired(deadline):
+            raise DeadlineExceeded(f"Deadline exceeded before running model '{self.name}'")
+        with self._lock:
+            if self._running < self.concurrency and not self._heap:
+                self._running += 1
+                return
+            waiting = self._waiting.get(priority, 0)
+            limit   = self.max_waiting.get(priority)
+            if admit and limit is not None and waiting >= limit:
+                self.rejected[priority] = self.rejected.get(priority, 0) + 1
+                ahead = sum(n for p, n in self._waiting.items() if p <= priority)
+                raise Overloaded(f"Model '{self.name}' is busy ({waiting} {PRIORITY_NAMES.get(priority, priority)} "
+                                 f"requests waiting)", status=429 if priority == BULK else 503,
+                                 retry_after=self.retry_after(ahead))
+            waiter = (priority, next(self._seq), threading.Event())
+            heapq.heappush(self._heap, waiter)
+            self._waiting[priority] = waiting + 1
+
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        waiter[2].wait(timeout)
+        with self._lock:
+            self._waiting[priority] -= 1
+            if waiter[2].is_set():
+                return
+            # hết hạn khi đang chờ: rời hàng đợi (heap chỉ khác rỗng khi mọi chỗ đang bận)
+            self._heap.remove(waiter)
+            heapq.heapify(self._heap)
+        raise DeadlineExceeded(f"Deadline exceeded while waiting for model '{self.name}'")
+
+    def release(self, held_s=None):
+        with self._lock:
+            if held_s is not None:
+                self._hold_s = 0.8 * self._hold_s + 0.2 * held_s
+            if self._heap:
+                # chuyển thẳng chỗ cho lượt chờ ưu tiên nhất, _running giữ nguyên
+                heapq.heappop(self._heap)[2].set()
+                return
+            self._running -= 1
+
+    @contextlib.contextmanager
+    def slot(self, priority=BULK, deadline=None, admit=True):
+        self.acquire(priority, deadline, admit)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "running":     self._running,
+                "concurrency": self.concurrency,
+                "waiting":     {PRIORITY_NAMES.get(p, p): n for p, n in self._waiting.items()},
+                "rejected":    {PRIORITY_NAMES.get(p, p): n for p, n in self.rejected.items()},
+                "hold_s":      self._hold_s,
+            }
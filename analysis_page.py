@@ -1,24 +1,38 @@
 import streamlit as st
-import uuid
+import json
+import pandas as pd
 from utils import get_predictions, insert_sentence, run_sql  # bạn có thể sửa tên tùy theo dự án
+from utils import start_predictions_many, submit_job, get_job, get_job_results, cancel_job, get_lists
+from sentence_ingest import save_results
+
+# cập nhật tiến độ/bảng kết quả tối đa 2 lần mỗi giây
+PROGRESS_INTERVAL_S = 0.5
+PAGE_SIZES = [50, 100, 500]
 
 
 def clear_input():
     st.session_state["input_text"] = ""
 
 
-def analysis_page(conn):
+def analysis_page(db):
     st.header("📊 Phân tích Cảm Xúc Theo Khía Cạnh Trong Phản Hồi Người Học")
 
     # Dropdown để chọn model, gọn và căn trái
-    col_model, _ = st.columns([2, 8])
+    col_model, col_mode, _ = st.columns([2, 2, 6])
     with col_model:
         model_choice = st.selectbox(
             "Chọn model", 
-            ["PhoBert_CNN_LSTM", "CNN_LSTM_ATTENTION"],
-            help="Chọn PhoBERT hoặc CNN_LSTM_Attention",
+            ["PhoBert_CNN_LSTM", "CNN_LSTM_ATTENTION", "CASCADE"],
+            help="Chọn PhoBERT, CNN_LSTM_Attention hoặc CASCADE (CNN trước, PhoBERT khi CNN không chắc chắn)",
             key="model_choice"
         )
+    with col_mode:
+        file_mode = st.selectbox(
+            "Chế độ phân tích file",
+            ["Pipeline", "Job nền"],
+            help="Pipeline: gửi nhiều lô song song và hiện kết quả ngay khi có; Job nền: Flask host tự chạy job",
+            key="file_mode"
+        )
 
     # Nhập câu hoặc tải file
     raw_text = st.text_area("Nhập câu (tiếng Việt):", key="input_text", height=150)
@@ -52,45 +66,141 @@ def analysis_page(conn):
             else:
                 st.info("Không phát hiện cặp (aspect, sentiment) nào.")
 
-    # Phân tích file từng dòng
+    # Phân tích file: "Pipeline" gửi các lô song song từ thread nền của trang,
+    # "Job nền" gửi job lên Flask host; cả hai chạy tiếp khi trang rerun
     if btn_file:
         if uploaded is None:
             st.warning("Chưa chọn file")
         else:
-            fname = uploaded.name
             content = uploaded.read().decode("utf-8")
             lines = [l for l in content.splitlines() if l.strip()]
-            total = len(lines)
-
-            # Khởi tạo session_state cho stop flag nếu chưa có
-            if "stop_file" not in st.session_state:
-                st.session_state["stop_file"] = False
-
-            # Hiển thị thanh tiến độ luôn
-            progress = st.progress(0)
-            # Nút dừng
-            if st.button("Stop", key="stop_file_btn"):
-                st.session_state["stop_file"] = True
-
-            # Expander luôn mở để giữ container
-            exp = st.expander(f"Kết quả phân tích file: {fname}", expanded=True)
-            with exp:
-                for i, line in enumerate(lines, start=1):
-                    # Dừng nếu người dùng nhấn Stop
-                    if st.session_state.get("stop_file"):
-                        st.warning("Quá trình đã bị dừng bởi người dùng.")
-                        break
-
-                    st.write(f"**{line}**")
-                    pairs = get_predictions(line, model=model_choice)
-                    if pairs:
-                        for asp, sen in pairs:
-                            st.write(f"  ↳ {asp} – {sen}")
-                    else:
-                        st.write("  ↳ Không phát hiện.")
-
-                    # Cập nhật tiến độ
-                    progress.progress(i / total)
-                else:
-                    st.success("Hoàn tất phân tích file!")
-
+            if file_mode == "Pipeline":
+                run = start_predictions_many(lines, model=model_choice)
+                st.session_state["file_job"] = {"run": run, "fname": uploaded.name}
+            else:
+                job = submit_job(lines, model=model_choice)
+                if job:
+                    st.session_state["file_job"] = {"id": job["id"], "fname": uploaded.name, "rows": []}
+
+    file_job = st.session_state.get("file_job")
+    if file_job:
+        running = file_status(file_job)["status"] in ("queued", "running")
+        # chỉ phần tiến độ/bảng được vẽ lại định kỳ, không rerun cả trang
+        st.fragment(run_every=PROGRESS_INTERVAL_S if running else None)(show_file_job)(db, file_job, running)
+
+
+def file_status(file_job):
+    if "run" in file_job:
+        return file_job["run"].info()
+    info = get_job(file_job["id"])
+    return info or {"status": "failed", "processed": 0, "total": 0, "progress": 0.0, "error": "Job not found"}
+
+
+def file_rows(file_job):
+    """(số dòng, câu, [(aspect, sentiment), ...]) đã có kết quả."""
+    if "run" in file_job:
+        return file_job["run"].rows()
+    rows = file_job["rows"]
+    # job trả kết quả theo thứ tự dòng: chỉ lấy phần mới
+    for line, pairs in get_job_results(file_job["id"], offset=len(rows)):
+        rows.append((len(rows) + 1, line, pairs))
+    return rows
+
+
+def stop_file_job(file_job):
+    if "run" in file_job:
+        file_job["run"].cancel()
+    else:
+        cancel_job(file_job["id"])
+
+
+def show_file_job(db, file_job, was_running):
+    info = file_status(file_job)
+    running = info["status"] in ("queued", "running")
+    if was_running and not running:
+        # vừa xong: rerun cả trang để tắt cập nhật định kỳ và hiện nút tải về
+        st.rerun()
+
+    st.progress(info["progress"], text=f"{info['processed']}/{info['total']} dòng")
+    if running and st.button("Stop", key="stop_file_btn"):
+        stop_file_job(file_job)
+        st.rerun()
+
+    if info["status"] == "cancelled":
+        st.warning("Quá trình đã bị dừng bởi người dùng.")
+    elif info["status"] == "failed":
+        st.error(f"Phân tích file thất bại: {info['error']}")
+    elif info["status"] == "done":
+        st.success("Hoàn tất phân tích file!")
+
+    rows = file_rows(file_job)
+    st.subheader(f"Kết quả phân tích file: {file_job['fname']}")
+    show_results_table(rows)
+    if not running and rows:
+        show_downloads(rows, file_job["fname"])
+        show_save_form(db, file_job, rows)
+
+
+def results_frame(rows):
+    return pd.DataFrame({
+        "Dòng":    [n for n, _, _ in rows],
+        "Câu":     [t for _, t, _ in rows],
+        "Kết quả": ["; ".join(f"{a} – {s}" for a, s in pairs) or "Không phát hiện" for _, _, pairs in rows],
+    })
+
+
+def show_results_table(rows):
+    """Bảng phân trang: mỗi lần chỉ dựng một trang, st.dataframe tự ảo hoá phần cuộn."""
+    if not rows:
+        st.info("Chưa có kết quả.")
+        return
+    col_size, col_page, _ = st.columns([2, 2, 6])
+    with col_size:
+        page_size = st.selectbox("Số dòng mỗi trang", PAGE_SIZES, index=1, key="result_page_size")
+    pages = (len(rows) + page_size - 1) // page_size
+    with col_page:
+        page = st.number_input(f"Trang (1–{pages})", min_value=1, max_value=pages, value=1, key="result_page")
+    start = (page - 1) * page_size
+    st.dataframe(results_frame(rows[start:start + page_size]), hide_index=True, use_container_width=True)
+
+
+def show_downloads(rows, fname):
+    base = fname.rsplit(".", 1)[0]
+    col_csv, col_jsonl, _ = st.columns([2, 2, 6])
+    with col_csv:
+        st.download_button("Tải CSV", results_frame(rows).to_csv(index=False).encode("utf-8-sig"),
+                           file_name=f"{base}_results.csv", mime="text/csv", use_container_width=True)
+    with col_jsonl:
+        jsonl = "".join(json.dumps({"line": n, "text": t,
+                                    "predictions": [{"aspect": a, "sentiment": s} for a, s in pairs]},
+                                   ensure_ascii=False) + "\n" for n, t, pairs in rows)
+        st.download_button("Tải JSONL", jsonl.encode("utf-8"), file_name=f"{base}_results.jsonl",
+                           mime="application/x-ndjson", use_container_width=True)
+
+
+def show_save_form(db, file_job, rows):
+    """Lưu kết quả file vào bảng Sentence, gắn học kỳ/môn/lớp cho mọi dòng."""
+    with st.expander("💾 Lưu kết quả vào cơ sở dữ liệu"):
+        if file_job.get("saved"):
+            st.info(f"Đã lưu {file_job['saved']} dòng từ file này.")
+            return
+        with db.reader() as conn:
+            semesters = get_lists(conn, "Semester")
+            courses   = conn.execute("SELECT code, name FROM Course").fetchall()
+            classes   = get_lists(conn, "Class")
+        col_sem, col_course, col_class = st.columns(3)
+        with col_sem:
+            semester = st.selectbox("Học kỳ", semesters, key="save_semester")
+        with col_course:
+            course = st.selectbox("Môn học", courses, format_func=lambda c: f"{c[0]} – {c[1]}", key="save_course")
+        with col_class:
+            class_name = st.selectbox("Lớp", classes, key="save_class")
+        if st.button("Lưu kết quả", key="save_results_btn"):
+            with db.writer() as conn:
+                inserted, unresolved, elapsed = save_results(
+                    conn, [(text, pairs) for _, text, pairs in rows],
+                    semester=semester, course_code=course[0] if course else None, class_name=class_name)
+            file_job["saved"] = inserted
+            st.success(f"Đã lưu {inserted} dòng trong {elapsed:.2f}s.")
+            if unresolved:
+                st.warning(f"{unresolved} dòng có khía cạnh/cảm xúc không có trong danh mục (lưu NULL).")
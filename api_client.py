@@ -0,0 +1,221 @@
+# api_client.py
+"""Client HTTP cho Flask host: một Session keep-alive dùng chung, retry có jitter,
+gửi nhiều câu theo lô song song và cache kết quả (LRU có TTL) trong process.
+
+Streamlit giữ một PredictionClient cho mọi phiên (xem utils.get_client); script
+nhập dữ liệu hàng loạt có thể tạo client riêng.
+"""
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from prediction_cache import PredictionCache, cache_key, normalize_text
+
+API_BASE          = os.environ.get("API_BASE", "http://localhost:5000")
+API_TIMEOUT_S     = float(os.environ.get("API_TIMEOUT_S", 60))
+API_RETRIES       = int(os.environ.get("API_RETRIES", 3))
+API_BACKOFF_S     = float(os.environ.get("API_BACKOFF_S", 0.5))
+API_CHUNK_SIZE    = int(os.environ.get("API_CHUNK_SIZE", 64))       # câu mỗi lần gọi endpoint batch
+API_MAX_PARALLEL  = int(os.environ.get("API_MAX_PARALLEL", 4))      # số lô gửi đồng thời
+API_CACHE_SIZE    = int(os.environ.get("API_CACHE_SIZE", 50_000))
+API_CACHE_TTL_S   = float(os.environ.get("API_CACHE_TTL_S", 3600))
+
+# Tên model trên giao diện -> (endpoint một câu, endpoint nhiều câu);
+# ghi đè bằng API_ENDPOINTS='{"PhoBert_CNN_LSTM": ["/predict_pho", "/predict_pho_batch"]}'
+ENDPOINTS = {
+    "PhoBert_CNN_LSTM":   ("/predict_pho", "/predict_pho_batch"),
+    "CNN_LSTM_ATTENTION": ("/predict_cnn", "/predict_cnn_batch"),
+    "CASCADE":            ("/predict_cascade", "/predict_cascade_batch"),
+}
+ENDPOINTS.update({k: tuple(v) for k, v in json.loads(os.environ.get("API_ENDPOINTS", "{}")).items()})
+
+# mã lỗi tạm thời: host quá tải (429/503 kèm Retry-After), hết deadline hoặc proxy lỗi
+RETRY_STATUS = {429, 502, 503, 504}
+
+
+def to_pairs(predictions):
+    return [(p["aspect"], p["sentiment"]) for p in predictions]
+
+
+class PredictionClient:
+    def __init__(self, base_url=API_BASE, timeout=API_TIMEOUT_S, retries=API_RETRIES, backoff=API_BACKOFF_S,
+                 chunk_size=API_CHUNK_SIZE, max_parallel=API_MAX_PARALLEL, cache_size=API_CACHE_SIZE,
+                 cache_ttl_s=API_CACHE_TTL_S, endpoints=None):
+        self.base_url     = base_url.rstrip("/")
+        self.timeout      = timeout
+        self.retries      = max(0, int(retries))
+        self.backoff      = backoff
+        self.chunk_size   = max(1, int(chunk_size))
+        self.max_parallel = max(1, int(max_parallel))
+        self.endpoints    = dict(ENDPOINTS, **(endpoints or {}))
+        self.cache        = PredictionCache(cache_size, cache_ttl_s)
+        self.session      = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_parallel + 2)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool      = None
+        self._pool_lock = threading.Lock()
+
+    # --- HTTP ---
+    def _delay(self, attempt, resp=None):
+        retry_after = resp.headers.get("Retry-After") if resp is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        # full jitter: tránh các client cùng retry một lúc
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def request(self, method, path, retry=True, **kwargs):
+        """Gửi request qua Session chung; lỗi kết nối và mã RETRY_STATUS được thử lại."""
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = self.retries + 1 if retry else 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                resp = self.session.request(method, self.base_url + path, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last:
+                    raise
+                time.sleep(self._delay(attempt))
+                continue
+            if resp.status_code in RETRY_STATUS and not last:
+                time.sleep(self._delay(attempt, resp))
+                continue
+            resp.raise_for_status()
+            return resp
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_parallel, thread_name_prefix="api-client")
+            return self._pool
+
+    # --- Dự đoán ---
+    def _keys(self, model, texts):
+        return [cache_key(model, "", normalize_text(t)) for t in texts]
+
+    def predict(self, text, model="PhoBert_CNN_LSTM"):
+        """[(aspect, sentiment), ...] cho một câu."""
+        key   = self._keys(model, [text])[0]
+        pairs = self.cache.get_many([key]).get(key)
+        if pairs is None:
+            resp  = self.request("POST", self.endpoints[model][0], json={"text": text})
+            pairs = to_pairs(resp.json().get("predictions", []))
+            self.cache.put_many({key: pairs})
+        return pairs
+
+    def _predict_chunk(self, model, texts):
+        resp  = self.request("POST", self.endpoints[model][1], json={"texts": texts})
+        preds = resp.json()["predictions"]
+        return [to_pairs(p) for p in preds]
+
+    def iter_many(self, texts, model="PhoBert_CNN_LSTM", cancel=None):
+        """Sinh các list (vị trí, kết quả) theo thứ tự lô xong trước: câu đã có trong cache (và câu rỗng)
+        trước, rồi từng lô `chunk_size` câu, tối đa `max_parallel` lô đang gửi cùng lúc.
+        Dừng ngay khi `cancel` (threading.Event) được set; lô chưa gửi bị bỏ."""
+        texts     = [t.strip() for t in texts]
+        keys      = self._keys(model, texts)
+        found     = self.cache.get_many(keys)
+        positions = {}
+        for i, k in enumerate(keys):
+            positions.setdefault(k, []).append(i)
+        ready = [(i, found.get(k, [])) for i, (k, t) in enumerate(zip(keys, texts)) if not t or k in found]
+        if ready:
+            yield ready
+        items  = [(k, texts[pos[0]]) for k, pos in positions.items() if texts[pos[0]] and k not in found]
+        chunks = iter([items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)])
+        running = {}
+        try:
+            while True:
+                while len(running) < self.max_parallel and not (cancel and cancel.is_set()):
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    running[self._executor().submit(self._predict_chunk, model, [t for _, t in chunk])] = chunk
+                if not running or (cancel and cancel.is_set()):
+                    return
+                # timeout ngắn để thấy cancel kể cả khi các lô đang chạy lâu
+                finished, _ = wait(running, timeout=0.2, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    chunk    = running.pop(fut)
+                    computed = dict(zip((k for k, _ in chunk), fut.result()))
+                    self.cache.put_many(computed)
+                    yield [(i, p) for k, p in computed.items() for i in positions[k]]
+        finally:
+            # lỗi hoặc bị ngắt giữa chừng: lô đang gửi chạy nốt ở nền, kết quả bị bỏ
+            for fut in running:
+                fut.cancel()
+
+    def predict_many(self, texts, model="PhoBert_CNN_LSTM", on_progress=None):
+        """Kết quả theo thứ tự `texts`, gọi endpoint batch song song (xem iter_many).
+        `on_progress(done, total)` được gọi mỗi khi xong một lô."""
+        results = [None] * len(texts)
+        done    = 0
+        for batch in self.iter_many(texts, model):
+            for i, pairs in batch:
+                results[i] = pairs
+            done += len(batch)
+            if on_progress:
+                on_progress(done, len(texts))
+        return results
+
+    def start_many(self, texts, model="PhoBert_CNN_LSTM"):
+        """Chạy iter_many ở thread nền, trả về BatchRun để theo dõi/dừng."""
+        return BatchRun(self, texts, model)
+
+    def stats(self):
+        return self.cache.stats()
+
+
+class BatchRun:
+    """Phân tích nhiều câu ở nền qua PredictionClient; kết quả được điền dần vào `results`."""
+
+    def __init__(self, client, texts, model):
+        self.texts    = list(texts)
+        self.model    = model
+        self.results  = [None] * len(self.texts)
+        self.processed = 0
+        self.status   = "running"
+        self.error    = None
+        self.started  = time.time()
+        self.finished = None
+        self._cancel  = threading.Event()
+        self._thread  = threading.Thread(target=self._run, args=(client,), daemon=True, name="api-batch-run")
+        self._thread.start()
+
+    def _run(self, client):
+        try:
+            for batch in client.iter_many(self.texts, self.model, self._cancel):
+                for i, pairs in batch:
+                    self.results[i] = pairs
+                self.processed += len(batch)
+            self.status = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+        self.finished = time.time()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def rows(self):
+        """(số dòng, câu, [(aspect, sentiment), ...]) của các câu đã có kết quả, theo thứ tự file."""
+        return [(i + 1, t, r) for i, (t, r) in enumerate(zip(self.texts, self.results)) if r is not None]
+
+    def info(self):
+        total = len(self.texts)
+        return {
+            "status":    self.status,
+            "processed": self.processed,
+            "total":     total,
+            "progress":  self.processed / total if total else 1.0,
+            "error":     self.error,
+            "elapsed_s": (self.finished or time.time()) - self.started,
+        }
@@ -2,12 +2,12 @@ import streamlit as st
 from analysis_page import analysis_page
 from stats_page import stats_page
 from setting_page import setting_page
-from utils import create_database, create_connection, DB_NAME
+from utils import create_database, get_db, DB_NAME
 
 def main():
     st.set_page_config(page_title="Aspect-Based Sentiment", layout="wide")
     create_database(DB_NAME)
-    conn = create_connection(DB_NAME)
+    db = get_db(DB_NAME)
 
     # Luôn đảm bảo 'page' có trong session
     if "page" not in st.session_state:
@@ -30,9 +30,10 @@ def main():
 
     # Hiển thị trang
     if page == "Phân tích":
-        analysis_page(conn)
+        analysis_page(db)
     elif page == "Thống kê":
-        stats_page(conn)
+        # đọc qua kết nối chỉ-đọc trong WAL (không bị chặn khi đang nhập dữ liệu), kết quả được cache
+        stats_page(db)
     elif page == "Cài đặt":
         setting_page()
     elif page == "Hướng dẫn":
@@ -0,0 +1,119 @@
+# batching.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from admission import Overloaded, DeadlineExceeded, expired
+from metrics import MICROBATCH_SIZE, MICROBATCH_WAIT_SECONDS, MICROBATCH_EXPIRED
+
+
+def length_buckets(lengths, bucket_size):
+    """Sắp chỉ số theo độ dài rồi chia thành các nhóm tối đa `bucket_size` phần tử.
+
+    Mỗi nhóm chỉ cần pad tới phần tử dài nhất của chính nó.
+    """
+    bucket_size = max(1, int(bucket_size))
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    return [order[i:i + bucket_size] for i in range(0, len(order), bucket_size)]
+
+
+class MicroBatcher:
+    """Gom các request đồng thời thành một batch và chạy một lần forward.
+
+    `predict_batch_fn(items)` nhận list đầu vào và trả về list kết quả cùng thứ tự.
+    Worker lấy ngay mọi request đang chờ, sau đó đợi thêm tối đa `max_wait_ms`
+    để lấp đầy batch (không quá `max_batch_size`). Hàng đợi có tối đa `max_queue` request
+    (0 = không giới hạn); request đã quá deadline bị bỏ trước khi chạy model.
+    """
+
+    def __init__(self, predict_batch_fn, max_batch_size=32, max_wait_ms=5.0, name="batcher", max_queue=0):
+        self.predict_batch_fn = predict_batch_fn
+        self.max_batch_size   = max(1, int(max_batch_size))
+        self.max_wait         = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name             = name
+        self.max_queue        = max(0, int(max_queue))
+        self._batch_s         = 0.05   # EWMA thời gian một batch, để ước lượng Retry-After
+        self._queue  = queue.Queue()
+        self._lock   = threading.Lock()
+        self._thread = None
+        self._pid    = None
+
+    def _ensure_started(self):
+        # Thread không sống sót qua fork nên khởi động lại nếu pid thay đổi
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue()
+            self._pid    = os.getpid()
+            self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit_async(self, item, deadline=None):
+        """Đưa một đầu vào vào hàng đợi, trả về Future; báo Overloaded nếu hàng đợi đầy."""
+        self._ensure_started()
+        pending = self._queue.qsize()
+        if self.max_queue and pending >= self.max_queue:
+            raise Overloaded(f"Queue '{self.name}' is full ({pending} requests waiting)", status=503,
+                             retry_after=self._batch_s * (pending / self.max_batch_size + 1))
+        fut = Future()
+        self._queue.put((item, fut, time.perf_counter(), deadline))
+        return fut
+
+    def submit(self, item, timeout=None, deadline=None):
+        """Đưa một đầu vào vào hàng đợi và chờ kết quả."""
+        return self.submit_async(item, deadline).result(timeout)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch    = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            try:
+                # lấy ngay những request đã có sẵn trong hàng đợi
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            now   = time.perf_counter()
+            live  = []
+            for item, fut, enqueued, deadline in batch:
+                MICROBATCH_WAIT_SECONDS.observe(now - enqueued, batcher=self.name)
+                if not fut.set_running_or_notify_cancel():
+                    continue
+                if expired(deadline):
+                    # client đã bỏ cuộc: không tốn công suy luận
+                    MICROBATCH_EXPIRED.inc(batcher=self.name)
+                    fut.set_exception(DeadlineExceeded(f"Deadline exceeded in queue '{self.name}'"))
+                    continue
+                live.append((item, fut))
+            if not live:
+                continue
+            MICROBATCH_SIZE.observe(len(live), batcher=self.name)
+            start = time.perf_counter()
+            try:
+                results = self.predict_batch_fn([item for item, _ in live])
+                for (_, fut), res in zip(live, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, fut in live:
+                    fut.set_exception(e)
+            self._batch_s = 0.8 * self._batch_s + 0.2 * (time.perf_counter() - start)
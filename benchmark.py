@@ -0,0 +1,200 @@
+# benchmark.py
+"""Benchmark suy luận trong process trên các file output_text_files/texts_*.txt.
+
+Chạy lưới cấu hình model × batch size × padding × số thread × engine. Mỗi tổ hợp
+(engine, số thread, model) chạy trong một process riêng để RSS và thời gian nạp model
+đo độc lập; trong process đó lần lượt chạy các corpus × batch size × padding.
+
+Mỗi lần gọi `runtime.predict` nhận `batch_size` câu liên tiếp của corpus (như một request
+batch), không qua cache. Kết quả ghi ra JSON để so sánh giữa các lần chạy (`--baseline`).
+
+Ví dụ:
+    python benchmark.py --models cnn --batch-sizes 1 8 32 --threads 1 4 --out bench.json
+    python benchmark.py --models cnn --baseline bench.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+
+GRID_KEYS = ("model", "engine", "threads", "corpus", "batch_size", "padding")
+
+
+def read_lines(path, limit=None):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [l.strip() for l in f if l.strip()]
+    return lines[:limit] if limit else lines
+
+
+def peak_rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+# ---------------- Worker: một (engine, threads, model) trong process con ----------------
+
+def run_worker(args):
+    import torch
+    torch.set_num_threads(args.threads)
+
+    t0 = time.perf_counter()
+    import flask_api_multi_model_host as host
+    import_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    runtime = host.registry.get(args.model)
+    load_s  = time.perf_counter() - t0
+
+    runs = []
+    for corpus in args.corpora:
+        texts = read_lines(corpus, args.limit)
+        for batch_size in args.batch_sizes:
+            chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+            for padding in args.paddings:
+                runtime.predict(chunks[0], padding, batch_size)  # làm nóng với đúng cấu hình
+                latencies = []
+                start = time.perf_counter()
+                for chunk in chunks:
+                    t = time.perf_counter()
+                    runtime.predict(chunk, padding, batch_size)
+                    latencies.append((time.perf_counter() - t) * 1000)
+                total = time.perf_counter() - start
+                runs.append({
+                    "model":            args.model,
+                    "engine":           args.engine,
+                    # engine thực sự dùng: onnx rơi về torch nếu chưa export/verify
+                    "engine_effective": "onnx" if runtime.session is not None else "torch",
+                    "precision":        runtime.precision,
+                    "threads":          args.threads,
+                    "corpus":           os.path.basename(corpus),
+                    "sentences":        len(texts),
+                    "batch_size":       batch_size,
+                    "padding":          padding,
+                    "sentences_per_s":  len(texts) / total,
+                    "p50_ms":           float(np.percentile(latencies, 50)),
+                    "p95_ms":           float(np.percentile(latencies, 95)),
+                    "p99_ms":           float(np.percentile(latencies, 99)),
+                    "import_s":         import_s,
+                    "load_s":           load_s,
+                })
+                print(f"  {args.model:<8}{args.engine:<6}{args.threads:>3}t "
+                      f"{os.path.basename(corpus):<16}bs={batch_size:<4}{padding:<11}"
+                      f"{runs[-1]['sentences_per_s']:>9.1f} sent/s", flush=True)
+    for run in runs:
+        run["peak_rss_mb"] = peak_rss_mb()
+    with open(args.result, "w", encoding="utf-8") as f:
+        json.dump(runs, f)
+
+
+# ---------------- Điều phối ----------------
+
+def run_config(args, engine, threads, model, result_path):
+    env = dict(os.environ, INFERENCE_ENGINE=engine, ORT_NUM_THREADS=str(threads),
+               OMP_NUM_THREADS=str(threads), MODEL_PRECISION=args.precision)
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--engine", engine,
+           "--threads", str(threads), "--model", model, "--result", result_path,
+           "--corpora", *args.corpora,
+           "--batch-sizes", *map(str, args.batch_sizes),
+           "--paddings", *args.paddings]
+    if args.limit:
+        cmd += ["--limit", str(args.limit)]
+    subprocess.run(cmd, env=env, check=True)
+    with open(result_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def run_key(run):
+    return tuple(run[k] for k in GRID_KEYS)
+
+
+def print_results(runs, baseline=None):
+    base = {run_key(r): r for r in (baseline or {}).get("runs", [])}
+    print(f"\n{'model':<9}{'engine':<7}{'thr':>4} {'corpus':<17}{'bs':>4} {'padding':<11}"
+          f"{'sent/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'RSS MB':>8}{'load s':>8}"
+          + (f"{'vs base':>9}" if base else ""))
+    for r in runs:
+        line = (f"{r['model']:<9}{r['engine_effective']:<7}{r['threads']:>4} {r['corpus']:<17}"
+                f"{r['batch_size']:>4} {r['padding']:<11}{r['sentences_per_s']:>9.1f}"
+                f"{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}"
+                f"{r['peak_rss_mb']:>8.0f}{r['load_s']:>8.2f}")
+        if base:
+            old = base.get(run_key(r))
+            line += f"{r['sentences_per_s'] / old['sentences_per_s']:>8.2f}x" if old else f"{'-':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark suy luận trên output_text_files")
+    parser.add_argument("--corpora", nargs="+", default=["output_text_files/texts_1000.txt"])
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ dùng N dòng đầu mỗi corpus")
+    parser.add_argument("--models", nargs="+", default=["phobert", "cnn"])
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 8, 32])
+    parser.add_argument("--paddings", nargs="+", default=["longest", "max_length"],
+                        choices=["longest", "max_length"])
+    parser.add_argument("--threads", nargs="+", type=int, default=[os.cpu_count() or 1])
+    parser.add_argument("--engines", nargs="+", default=["torch"], choices=["torch", "onnx"])
+    parser.add_argument("--precision", default=os.environ.get("MODEL_PRECISION", "fp32"))
+    parser.add_argument("--out", default="benchmark_results.json", help="File JSON kết quả")
+    parser.add_argument("--baseline", default=None, help="File JSON của lần chạy trước để so sánh")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", default="torch", help=argparse.SUPPRESS)
+    parser.add_argument("--model", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.threads = args.threads[0]
+        run_worker(args)
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for engine in args.engines:
+            for threads in args.threads:
+                for model in args.models:
+                    path = os.path.join(tmp, f"{engine}_{threads}_{model}.json")
+                    runs += run_config(args, engine, threads, model, path)
+
+    import torch
+    result = {
+        "meta": {
+            "created_at":     time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit":     git_commit(),
+            "python":         platform.python_version(),
+            "torch":          torch.__version__,
+            "platform":       platform.platform(),
+            "cpu_count":      os.cpu_count(),
+            "precision":      args.precision,
+            "cnn_pad_margin": os.environ.get("CNN_PAD_MARGIN"),
+        },
+        "runs": runs,
+    }
+    print_results(runs, baseline)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"\nĐã ghi {len(runs)} kết quả vào {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+# calibrate_cascade.py
+"""Chọn dải bất định (`band`) cho chế độ cascade CNN -> PhoBERT trên data_20k.xlsx.
+
+Chạy cả hai model trên toàn bộ câu một lần, rồi với mỗi band tính:
+  - tỉ lệ câu phải chuyển sang PhoBERT
+  - agreement: tỉ lệ câu mà tập nhãn của cascade trùng với PhoBERT
+  - gold: độ chính xác cảm xúc cấp câu so với cột `label` (xem precision_report.py)
+  - chi phí ước tính so với chỉ dùng PhoBERT (theo thời gian đo được của từng model)
+Band được chọn là band nhỏ nhất đạt `--target` theo `--metric`.
+
+Ví dụ:
+    python calibrate_cascade.py --limit 5000 --metric agreement --target 0.95 --write
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from cascade import cascade_config, uncertain_rows
+from model_registry import MODEL_CONFIG
+from prediction_cache import normalize_text
+from precision_report import load_texts, label_names, sentence_sentiment
+
+
+def aligned_probs(runtime, texts, names, batch_size):
+    """Xác suất của model, cột sắp theo thứ tự nhãn của label_map.json; kèm thời gian chạy."""
+    norm  = [normalize_text(t, runtime.spec.get("lowercase", False)) for t in texts]
+    start = time.perf_counter()
+    probs = runtime.predict_probs(norm, "longest", batch_size)
+    elapsed = time.perf_counter() - start
+    order = [next(i for i, (a, s) in runtime.idx2label.items() if f"{a}###{s}".lower() == n.lower())
+             for n in names]
+    return probs[:, order], elapsed
+
+
+def sweep(fast_probs, fast_thr, acc_probs, acc_thr, gold, fast_cost, acc_cost, bands, idx2label):
+    fast_labels = fast_probs > fast_thr
+    acc_labels  = acc_probs > acc_thr
+    fast_sent   = sentence_sentiment(fast_probs, idx2label)
+    acc_sent    = sentence_sentiment(acc_probs, idx2label)
+    rows = []
+    for band in bands:
+        unsure = uncertain_rows(fast_probs, fast_thr, band)
+        labels = np.where(unsure[:, None], acc_labels, fast_labels)
+        sent   = np.where(unsure, acc_sent, fast_sent)
+        frac   = float(unsure.mean())
+        rows.append({
+            "band":              float(band),
+            "accurate_fraction": frac,
+            "agreement":         float((labels == acc_labels).all(axis=1).mean()),
+            "gold":              float((sent == gold).mean()),
+            # chi phí mỗi câu so với chạy PhoBERT cho mọi câu
+            "relative_cost":     (fast_cost + frac * acc_cost) / acc_cost,
+        })
+    return rows
+
+
+def write_band(path, band):
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config.setdefault("cascade", {})["band"] = band
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chọn band cho chế độ cascade CNN -> PhoBERT")
+    parser.add_argument("--data", default="data_20k.xlsx")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ dùng N câu đầu")
+    parser.add_argument("--metric", default="agreement", choices=["agreement", "gold"])
+    parser.add_argument("--target", type=float, default=0.95, help="Giá trị metric tối thiểu cần đạt")
+    parser.add_argument("--step", type=float, default=0.02, help="Bước của lưới band")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--write", action="store_true", help="Ghi band đã chọn vào models.json")
+    parser.add_argument("--json", default=None, help="Ghi toàn bộ bảng ra file JSON")
+    args = parser.parse_args()
+
+    import flask_api_multi_model_host as host
+    cfg   = cascade_config(host.registry.config)
+    fast  = host.registry.get(cfg["fast"])
+    acc   = host.registry.get(cfg["accurate"])
+    names = label_names()
+
+    texts, gold = load_texts(args.data, args.limit)
+    fast_probs, fast_s = aligned_probs(fast, texts, names, args.batch_size)
+    acc_probs,  acc_s  = aligned_probs(acc,  texts, names, args.batch_size)
+    idx2label = {i: tuple(n.split("###")) for i, n in enumerate(names)}
+
+    bands = np.round(np.arange(0.0, 0.5 + 1e-9, args.step), 4)
+    rows  = sweep(fast_probs, fast.threshold, acc_probs, acc.threshold, gold,
+                  fast_s / len(texts), acc_s / len(texts), bands, idx2label)
+
+    print(f"{len(texts)} câu; {cfg['fast']}: {len(texts) / fast_s:.0f} câu/s, "
+          f"{cfg['accurate']}: {len(texts) / acc_s:.0f} câu/s")
+    print(f"gold chỉ {cfg['fast']}: {rows[0]['gold']:.4f}, chỉ {cfg['accurate']}: "
+          f"{float((sentence_sentiment(acc_probs, idx2label) == gold).mean()):.4f}")
+    print(f"{'band':>6}{'→ accurate':>12}{'agreement':>11}{'gold':>8}{'cost':>7}")
+    for r in rows:
+        print(f"{r['band']:>6.2f}{r['accurate_fraction']:>12.1%}{r['agreement']:>11.4f}"
+              f"{r['gold']:>8.4f}{r['relative_cost']:>7.2f}")
+
+    ok     = [r for r in rows if r[args.metric] >= args.target]
+    chosen = ok[0] if ok else rows[-1]
+    if not ok:
+        print(f"Không band nào đạt {args.metric} >= {args.target}; dùng band lớn nhất")
+    print(f"Band đề xuất: {chosen['band']:.2f} ({chosen['accurate_fraction']:.1%} câu sang "
+          f"{cfg['accurate']}, {args.metric}={chosen[args.metric]:.4f}, "
+          f"chi phí ≈ {chosen['relative_cost']:.2f} x {cfg['accurate']})")
+
+    if args.write:
+        write_band(MODEL_CONFIG, chosen["band"])
+        print(f"Đã ghi band={chosen['band']} vào {MODEL_CONFIG}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"metric": args.metric, "target": args.target, "chosen": chosen, "rows": rows},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
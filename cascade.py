@@ -0,0 +1,28 @@
+# cascade.py
+"""Cascade hai model: model nhanh (CNN) quyết định trước, câu nào có xác suất nhãn nằm
+trong dải bất định quanh ngưỡng của model nhanh mới được chuyển sang model chính xác (PhoBERT).
+
+Cấu hình nằm ở khoá "cascade" của models.json; `band` được chọn bằng calibrate_cascade.py.
+"""
+import os
+
+import numpy as np
+
+DEFAULT_CASCADE = {"fast": "cnn", "accurate": "phobert", "band": 0.2}
+# ghi đè band khi chạy, vd. CASCADE_BAND=0.1
+CASCADE_BAND    = os.environ.get("CASCADE_BAND")
+
+
+def cascade_config(config):
+    cfg = dict(DEFAULT_CASCADE, **config.get("cascade", {}))
+    if CASCADE_BAND is not None:
+        cfg["band"] = float(CASCADE_BAND)
+    cfg["band"] = float(cfg["band"])
+    return cfg
+
+
+def uncertain_rows(probs, threshold, band):
+    """True cho các câu có ít nhất một nhãn với |p - threshold| < band."""
+    if band <= 0:
+        return np.zeros(len(probs), dtype=bool)
+    return (np.abs(np.asarray(probs) - threshold) < band).any(axis=1)
@@ -0,0 +1,90 @@
+# check_query_plans.py
+"""Kiểm tra EXPLAIN QUERY PLAN của các truy vấn trang thống kê: báo lỗi (exit 1) nếu truy vấn
+nào phải quét toàn bộ bảng Sentence thay vì dùng index.
+
+Các truy vấn được sinh bằng chính stats_queries.py với mọi tổ hợp bộ lọc mà stats_page dùng,
+đếm trực tiếp trên Sentence (STATS_SOURCE=sentence). Bảng SentenceRollup chỉ có vài nghìn dòng
+nên được phép quét.
+Mặc định kiểm tra trên một DB tạm vừa tạo từ các migration; `--db` để kiểm tra DB thật.
+
+Ví dụ:
+    python check_query_plans.py
+    python check_query_plans.py --db aspect_sa.db --verbose
+"""
+import os
+import sys
+import sqlite3
+import argparse
+import tempfile
+from itertools import combinations
+
+from stats_queries import load_labels, count_sql, raw_sql
+
+FULL_SCAN_TABLES = ("Sentence",)
+
+
+def stats_queries(labels):
+    """(tên, sql, tham số) cho từng truy vấn mà stats_page có thể chạy."""
+    first = {dim: next(iter(values.values()), None) for dim, values in labels.items()}
+    general = {dim: list(values.values()) for dim, values in labels.items()}
+    queries = []
+    for dim in ("sentiment", "aspect"):
+        queries.append((f"chung: đếm theo {dim}",) + count_sql([dim], general, labels, "sentence"))
+    queries.append(("chung: dữ liệu gốc",) + raw_sql(general, labels))
+    # so sánh chéo: mọi tổ hợp lọc học kỳ/môn/lớp, mọi chiều X
+    for n in range(4):
+        for keys in combinations(("semester", "course", "class"), n):
+            filters = {k: first[k] for k in keys}
+            for dim in ("aspect", "semester", "course", "class"):
+                queries.append((f"so sánh chéo: {dim} lọc {'/'.join(keys) or '-'}",)
+                               + count_sql([dim, "sentiment"], filters, labels, "sentence"))
+    # trend: một khía cạnh, lọc môn/lớp
+    for n in range(3):
+        for keys in combinations(("course", "class"), n):
+            filters = dict({k: first[k] for k in keys}, aspect=first["aspect"])
+            queries.append((f"trend: lọc {'/'.join(keys) or '-'}",)
+                           + count_sql(["semester", "sentiment"], filters, labels, "sentence"))
+    return [q for q in queries if q[1] is not None]
+
+
+def full_scans(conn, sql, params):
+    """Các bước của query plan quét toàn bảng (SCAN <bảng> không qua index)."""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+    bad  = [d for d in plan
+            if any(d == f"SCAN {t}" or d.startswith(f"SCAN {t} ") for t in FULL_SCAN_TABLES) and "INDEX" not in d]
+    return plan, bad
+
+
+def check(conn, verbose=False):
+    failures = 0
+    for name, sql, params in stats_queries(load_labels(conn)):
+        plan, bad = full_scans(conn, sql, params)
+        if bad:
+            failures += 1
+            print(f"FULL SCAN  {name}\n    {sql}\n    " + "\n    ".join(plan))
+        elif verbose:
+            print(f"ok         {name}: " + " | ".join(plan))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiểm tra query plan của các truy vấn thống kê")
+    parser.add_argument("--db", default=None, help="DB cần kiểm tra (mặc định: DB tạm tạo từ migration)")
+    parser.add_argument("--verbose", action="store_true", help="In plan của cả các truy vấn đạt")
+    args = parser.parse_args()
+
+    from utils import create_database
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = args.db or os.path.join(tmp, "plan_check.db")
+        create_database(db_file)
+        conn = sqlite3.connect(db_file)
+        try:
+            failures = check(conn, args.verbose)
+        finally:
+            conn.close()
+    print(f"{failures} truy vấn quét toàn bảng" if failures else "Mọi truy vấn thống kê đều dùng index")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
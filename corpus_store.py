@@ -0,0 +1,223 @@
+# corpus_store.py
+"""Kho corpus đã tokenize sẵn (mảng numpy trên đĩa, đọc bằng memory map) để chấm lại hàng loạt.
+
+Mỗi corpus (bảng Sentence, data_20k.xlsx hay texts_*.txt) được tokenize một lần cho mỗi
+tokenizer/vocab, lưu ở `CORPUS_STORE_DIR/<corpus>/<model>-<tokenizer_version>/`:
+    ids.npy      id token nối liền của mọi câu (int16 nếu vocab đủ nhỏ, ngược lại int32)
+    offsets.npy  vị trí bắt đầu của từng câu trong ids (int64)
+    lengths.npy  số token của từng câu (int32)
+    keys.json    khoá của từng câu trong nguồn (Sentence.id, số dòng Excel hoặc số dòng file)
+    meta.json    model, tokenizer_version, nguồn, số câu, số token
+Khi vocab/tokenizer đổi, version đổi và cần build lại; đổi trọng số model thì không.
+
+Ví dụ:
+    python corpus_store.py build --source data_20k.xlsx --models cnn phobert
+    python corpus_store.py score --corpus data_20k --model cnn --out scores_cnn.npz
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+from itertools import chain
+
+import numpy as np
+
+from prediction_cache import normalize_text
+
+CORPUS_STORE_DIR = os.environ.get("CORPUS_STORE_DIR", "corpus_store")
+
+
+# ---------------- Nguồn ----------------
+
+def read_source(path):
+    """(keys, texts) từ file .txt (mỗi dòng một câu), .xlsx (cột `text`) hoặc .db (bảng Sentence)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".txt":
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [(i, l.strip()) for i, l in enumerate(f) if l.strip()]
+    elif ext in (".xlsx", ".xls"):
+        import pandas as pd
+        df = pd.read_excel(path).dropna(subset=["text"])
+        rows = [(int(i), str(t).strip()) for i, t in zip(df.index, df["text"])]
+    elif ext in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(path)
+        try:
+            rows = conn.execute("SELECT id, text FROM Sentence ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+    else:
+        raise ValueError(f"Không hỗ trợ nguồn: {path}")
+    return [k for k, _ in rows], [t for _, t in rows]
+
+
+def corpus_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def store_dir(corpus, model, version, root=CORPUS_STORE_DIR):
+    return os.path.join(root, corpus, f"{model}-{version}")
+
+
+# ---------------- Build ----------------
+
+def build_store(runtime, keys, texts, out_dir, source=None, chunk_size=10_000):
+    """Tokenize `texts` bằng runtime.encode (cùng chuẩn hoá với Flask host) rồi ghi ra out_dir."""
+    lowercase = runtime.spec.get("lowercase", False)
+    parts, lengths = [], []
+    for start in range(0, len(texts), chunk_size):
+        encoded = runtime.encode([normalize_text(t, lowercase) for t in texts[start:start + chunk_size]])
+        lens    = np.fromiter(map(len, encoded), dtype=np.int32, count=len(encoded))
+        parts.append(np.fromiter(chain.from_iterable(encoded), dtype=np.int64, count=int(lens.sum())))
+        lengths.append(lens)
+    ids     = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int32)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    dtype   = np.int16 if ids.size == 0 or ids.max() <= np.iinfo(np.int16).max else np.int32
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "ids.npy"), ids.astype(dtype))
+    np.save(os.path.join(out_dir, "offsets.npy"), offsets)
+    np.save(os.path.join(out_dir, "lengths.npy"), lengths)
+    with open(os.path.join(out_dir, "keys.json"), "w", encoding="utf-8") as f:
+        json.dump(keys, f, ensure_ascii=False)
+    meta = {
+        "model":             runtime.name,
+        "kind":              runtime.kind,
+        "tokenizer_version": runtime.tokenizer_version(),
+        "max_length":        runtime.max_length,
+        "source":            source,
+        "sentences":         len(lengths),
+        "tokens":            int(ids.size),
+        "dtype":             np.dtype(dtype).name,
+        "created_at":        time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(os.path.join(out_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+
+# ---------------- Đọc + chấm ----------------
+
+class CorpusStore:
+    """Kho đã build, các mảng được mở bằng np.load(mmap_mode="r")."""
+
+    def __init__(self, path):
+        self.path    = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.ids     = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def keys(self):
+        with open(os.path.join(self.path, "keys.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def batches(self, batch_size):
+        """Sinh (chỉ số câu, list mảng id) theo thứ tự độ dài tăng dần; mảng id là view của memory map."""
+        order = np.argsort(self.lengths, kind="stable")
+        ids, offsets, lengths = self.ids, self.offsets, self.lengths
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            yield rows, [ids[offsets[i]:offsets[i] + lengths[i]] for i in rows]
+
+
+def open_store(corpus, runtime, root=CORPUS_STORE_DIR):
+    """Kho của `corpus` khớp tokenizer hiện tại của runtime; báo lỗi nếu cần build lại."""
+    version = runtime.tokenizer_version()
+    path    = store_dir(corpus, runtime.name, version, root)
+    if not os.path.isdir(path):
+        raise FileNotFoundError(
+            f"Chưa có kho cho corpus '{corpus}', model '{runtime.name}' (tokenizer {version}); "
+            f"chạy: python corpus_store.py build --source <file> --models {runtime.name}")
+    return CorpusStore(path)
+
+
+def score_store(runtime, store, batch_size=64, padding="longest"):
+    """Xác suất (n, num_labels) theo thứ tự câu trong kho, cùng thời gian collate/forward."""
+    probs = np.zeros((len(store), len(runtime.idx2label)), dtype=np.float32)
+    collate_s = forward_s = 0.0
+    for rows, ids_list in store.batches(batch_size):
+        t0 = time.perf_counter()
+        batch = runtime.collate(ids_list, padding)
+        t1 = time.perf_counter()
+        probs[rows] = runtime.run(batch)
+        collate_s += t1 - t0
+        forward_s += time.perf_counter() - t1
+    return probs, collate_s, forward_s
+
+
+# ---------------- CLI ----------------
+
+def cmd_build(args):
+    import torch
+    from inference_models import RUNTIMES
+    from model_registry import load_config
+
+    config = load_config()
+    keys, texts = read_source(args.source)
+    corpus = args.name or corpus_name(args.source)
+    for name in args.models:
+        spec    = config["models"][name]
+        runtime = RUNTIMES[spec["type"]](name, spec, torch.device("cpu")).load_tokenizer()
+        out_dir = store_dir(corpus, name, runtime.tokenizer_version(), args.root)
+        start   = time.perf_counter()
+        meta    = build_store(runtime, keys, texts, out_dir, source=os.path.abspath(args.source))
+        print(f"{name}: {meta['sentences']} câu, {meta['tokens']} token ({meta['dtype']}) "
+              f"trong {time.perf_counter() - start:.1f}s -> {out_dir}")
+
+
+def cmd_score(args):
+    import flask_api_multi_model_host as host
+
+    runtime = host.registry.get(args.model)
+    store   = open_store(args.corpus, runtime, args.root)
+    start   = time.perf_counter()
+    probs, collate_s, forward_s = score_store(runtime, store, args.batch_size, args.padding)
+    total   = time.perf_counter() - start
+    print(f"{args.model}: {len(store)} câu trong {total:.1f}s ({len(store) / max(total, 1e-9):.0f} câu/s); "
+          f"collate {collate_s:.1f}s, forward {forward_s:.1f}s")
+
+    keys   = store.keys()
+    labels = [f"{a}###{s}" for _, (a, s) in sorted(runtime.idx2label.items())]
+    np.savez(args.out, keys=np.array([str(k) for k in keys]), probs=probs, labels=np.array(labels),
+             threshold=runtime.threshold)
+    print(f"Đã ghi {args.out}")
+    if args.jsonl:
+        with open(args.jsonl, "w", encoding="utf-8") as f:
+            for key, row in zip(keys, probs):
+                f.write(json.dumps({"key": key, "predictions": runtime.decode(row)}, ensure_ascii=False) + "\n")
+        print(f"Đã ghi {args.jsonl}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kho corpus tokenize sẵn + chấm hàng loạt")
+    parser.add_argument("--root", default=CORPUS_STORE_DIR, help="Thư mục chứa các kho")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="Tokenize một corpus cho các model")
+    p.add_argument("--source", required=True, help=".txt, .xlsx (cột text) hoặc .db (bảng Sentence)")
+    p.add_argument("--models", nargs="+", default=["phobert", "cnn"])
+    p.add_argument("--name", default=None, help="Tên corpus (mặc định: tên file nguồn)")
+    p.set_defaults(func=cmd_build)
+
+    p = sub.add_parser("score", help="Chấm một kho đã build bằng model hiện tại")
+    p.add_argument("--corpus", required=True, help="Tên corpus đã build")
+    p.add_argument("--model", required=True)
+    p.add_argument("--batch-size", type=int, default=64)
+    p.add_argument("--padding", default="longest", choices=["longest", "max_length"])
+    p.add_argument("--out", required=True, help="File .npz (keys, probs, labels, threshold)")
+    p.add_argument("--jsonl", default=None, help="Ghi thêm nhãn đã giải mã ra JSONL")
+    p.set_defaults(func=cmd_score)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
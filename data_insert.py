@@ -0,0 +1,235 @@
+# data_insert.py
+"""Nhập hàng loạt câu phản hồi (data_20k.xlsx, .csv hoặc .txt) vào bảng Sentence.
+
+Đọc nguồn theo từng chunk (không nạp cả file), chấm bằng endpoint batch của Flask host
+(hoặc trực tiếp trong process với --local), rồi ghi mỗi chunk trong một transaction cùng với
+checkpoint (bảng ImportCheckpoint). Bị ngắt giữa chừng thì chạy lại đúng lệnh cũ để làm tiếp;
+id của mỗi dòng được sinh cố định từ (tên lượt nhập, số dòng, câu, cặp nhãn) nên chạy lại
+trên cùng input không tạo bản ghi trùng.
+
+Ví dụ:
+    python data_insert.py --source data_20k.xlsx --random-tags
+    python data_insert.py --source feedback.csv --semester 2024HK1 --course CS101 --class K48A
+"""
+import os
+import csv
+import time
+import uuid
+import random
+import hashlib
+import argparse
+
+from utils import DB_NAME, JOB_MODELS, create_database
+from database import ConnectionManager
+from sentence_ingest import DimensionLookup, insert_sentences
+
+IMPORT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", 1000))
+# namespace cho id cố định của các dòng được nhập
+IMPORT_NAMESPACE  = uuid.UUID("5f0c3a52-7d8e-4c1b-9a57-2b1d6e9f4a30")
+# cột tuỳ chọn trong csv/xlsx, ghi đè nhãn từ tham số dòng lệnh
+TAG_COLUMNS       = ("semester", "course", "academic_year", "class", "student")
+
+
+# ---------------- Nguồn ----------------
+
+def iter_source(path):
+    """Sinh (số dòng, text, {cột nhãn: giá trị}) lần lượt từ file, không nạp cả file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".txt":
+        with open(path, "r", encoding="utf-8") as f:
+            for i, line in enumerate(f, 1):
+                yield i, line.strip(), {}
+    elif ext == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for i, row in enumerate(csv.DictReader(f), 1):
+                yield i, (row.get("text") or "").strip(), {c: row[c] for c in TAG_COLUMNS if row.get(c)}
+    elif ext == ".xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows   = wb.active.iter_rows(values_only=True)
+            header = [str(h).strip().lower() if h is not None else "" for h in next(rows, ())]
+            if "text" not in header:
+                raise ValueError(f"{path}: không có cột 'text'")
+            text_col = header.index("text")
+            tag_cols = {c: header.index(c) for c in TAG_COLUMNS if c in header}
+            for i, row in enumerate(rows, 1):
+                text = row[text_col] if text_col < len(row) else None
+                tags = {c: row[j] for c, j in tag_cols.items() if j < len(row) and row[j] is not None}
+                yield i, "" if text is None else str(text).strip(), tags
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Không hỗ trợ nguồn: {path} (.xlsx, .csv, .txt)")
+
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_fingerprint(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---------------- Checkpoint (bảng ImportCheckpoint, tạo trong utils.MIGRATIONS) ----------------
+
+def load_checkpoint(conn, name):
+    row = conn.execute("SELECT fingerprint, model, rows_done, inserted, finished FROM ImportCheckpoint WHERE name=?",
+                       (name,)).fetchone()
+    return dict(zip(("fingerprint", "model", "rows_done", "inserted", "finished"), row)) if row else None
+
+
+def save_checkpoint(conn, name, fingerprint, model, rows_done, inserted, finished=False):
+    conn.execute("""
+    INSERT INTO ImportCheckpoint (name, fingerprint, model, rows_done, inserted, finished, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(name) DO UPDATE SET
+        fingerprint=excluded.fingerprint, model=excluded.model, rows_done=excluded.rows_done,
+        inserted=excluded.inserted, finished=excluded.finished, updated_at=excluded.updated_at
+    """, (name, fingerprint, model, rows_done, inserted, int(finished), time.strftime("%Y-%m-%dT%H:%M:%S")))
+
+
+# ---------------- Nhãn ----------------
+
+class RandomTags:
+    """Sinh viên/môn/học kỳ ngẫu nhiên như notebook cũ, nhưng cố định theo số dòng để chạy lại cho cùng kết quả."""
+
+    def __init__(self, conn, seed=0):
+        self.seed     = seed
+        self.courses  = [r[0] for r in conn.execute("SELECT code FROM Course ORDER BY id")]
+        semesters     = {r[0] for r in conn.execute("SELECT name FROM Semester")}
+        self.students = []
+        for code, start_year in conn.execute("""
+            SELECT St.student_code, AY.start_year
+            FROM Student St
+              JOIN Class        C  ON St.class_id        = C.id
+              JOIN AcademicYear AY ON C.academic_year_id = AY.id
+            ORDER BY St.id
+        """):
+            sems = [s for s in (f"{start_year}HK1", f"{start_year}HK2") if s in semesters]
+            if sems:
+                self.students.append((code, sems))
+
+    def __call__(self, row_no):
+        rng = random.Random(f"{self.seed}:{row_no}")
+        student, sems = rng.choice(self.students)
+        return {"student": student, "semester": rng.choice(sems), "course": rng.choice(self.courses)}
+
+
+# ---------------- Chấm ----------------
+
+def http_scorer(model):
+    from api_client import PredictionClient
+    client = PredictionClient()
+    return lambda texts: client.predict_many(texts, model)
+
+
+def local_scorer(model):
+    import flask_api_multi_model_host as host
+    name = JOB_MODELS[model]
+    return lambda texts: [[(p["aspect"], p["sentiment"]) for p in preds] for preds in host.predict_any(name, texts)]
+
+
+# ---------------- Nhập ----------------
+
+def import_file(conn, args):
+    name        = args.name or os.path.basename(args.source)
+    fingerprint = file_fingerprint(args.source)
+    checkpoint  = load_checkpoint(conn, name)
+    if checkpoint and checkpoint["fingerprint"] != fingerprint:
+        print(f"{args.source} đã thay đổi kể từ lần nhập trước; nhập lại từ đầu (dòng đã có được bỏ qua)")
+        checkpoint = None
+    if checkpoint and checkpoint["finished"] and not args.force:
+        print(f"'{name}' đã nhập xong ({checkpoint['rows_done']} dòng, {checkpoint['inserted']} bản ghi); "
+              f"dùng --force để chạy lại")
+        return
+    skip     = checkpoint["rows_done"] if checkpoint and not args.force else 0
+    inserted = checkpoint["inserted"] if checkpoint else 0
+    if skip:
+        print(f"Tiếp tục '{name}' từ dòng {skip + 1}")
+
+    lookup = DimensionLookup(conn)
+    fixed  = {"semester": args.semester, "course": args.course, "academic_year": args.academic_year,
+              "class": args.class_name, "student": args.student}
+    fixed  = {k: v for k, v in fixed.items() if v}
+    random_tags = RandomTags(conn, args.seed) if args.random_tags else None
+    score  = (local_scorer if args.local else http_scorer)(args.model)
+
+    rows_done, start = skip, time.perf_counter()
+    rows = (r for r in iter_source(args.source) if r[0] > skip)
+    for chunk in chunks(rows, args.chunk_size):
+        t0      = time.perf_counter()
+        texts   = [text for _, text, _ in chunk if text]
+        results = iter(score(texts)) if texts else iter(())
+        records, ids = [], []
+        for row_no, text, row_tags in chunk:
+            if not text:
+                continue
+            pairs = next(results)
+            tags  = {**(random_tags(row_no) if random_tags else {}), **fixed, **row_tags}
+            for k, (aspect, sentiment) in enumerate(pairs):
+                records.append((text, aspect, sentiment, tags.get("semester"), tags.get("course"),
+                                tags.get("academic_year"), tags.get("class"), tags.get("student")))
+                ids.append(str(uuid.uuid5(IMPORT_NAMESPACE, f"{name}\x00{row_no}\x00{text}\x00{k}")))
+        t1 = time.perf_counter()
+        # bản ghi và checkpoint cùng một transaction: bị ngắt thì cả chunk được làm lại
+        with conn:
+            n, _ = insert_sentences(conn, records, lookup=lookup, ids=ids, commit=False)
+            inserted  += n
+            rows_done  = chunk[-1][0]
+            save_checkpoint(conn, name, fingerprint, args.model, rows_done, inserted)
+        elapsed = time.perf_counter() - start
+        print(f"dòng {rows_done}: +{n} bản ghi | chấm {t1 - t0:.2f}s, ghi {time.perf_counter() - t1:.2f}s | "
+              f"{(rows_done - skip) / max(elapsed, 1e-9):.0f} dòng/s")
+
+    with conn:
+        save_checkpoint(conn, name, fingerprint, args.model, rows_done, inserted, finished=True)
+    elapsed = time.perf_counter() - start
+    print(f"Xong '{name}': {rows_done - skip} dòng trong {elapsed:.1f}s "
+          f"({(rows_done - skip) / max(elapsed, 1e-9):.0f} dòng/s), tổng {inserted} bản ghi")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nhập câu phản hồi vào bảng Sentence (có checkpoint, chạy tiếp được)")
+    parser.add_argument("--source", default="data_20k.xlsx", help=".xlsx/.csv (cột text) hoặc .txt (mỗi dòng một câu)")
+    parser.add_argument("--db", default=DB_NAME)
+    parser.add_argument("--name", default=None, help="Tên lượt nhập cho checkpoint (mặc định: tên file)")
+    parser.add_argument("--model", default="PhoBert_CNN_LSTM", choices=list(JOB_MODELS))
+    parser.add_argument("--local", action="store_true", help="Chấm trong process thay vì gọi Flask host")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE)
+    parser.add_argument("--force", action="store_true", help="Chạy lại từ đầu dù đã có checkpoint")
+    parser.add_argument("--semester", default=None)
+    parser.add_argument("--course", default=None, help="Mã môn, vd. CS101")
+    parser.add_argument("--academic-year", default=None, help="vd. 2023-2024 (mặc định: theo lớp)")
+    parser.add_argument("--class", dest="class_name", default=None)
+    parser.add_argument("--student", default=None, help="Mã sinh viên")
+    parser.add_argument("--random-tags", action="store_true",
+                        help="Gán sinh viên/môn/học kỳ ngẫu nhiên (cố định theo số dòng) cho dữ liệu demo")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    create_database(args.db)
+    db = ConnectionManager(args.db)
+    try:
+        # WAL: dashboard vẫn đọc được trong lúc nhập; mỗi chunk là một transaction ngắn
+        with db.writer() as conn:
+            import_file(conn, args)
+    except KeyboardInterrupt:
+        print("Đã dừng; chạy lại cùng lệnh để tiếp tục từ checkpoint")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# database.py
+"""Quản lý kết nối SQLite dùng chung cho Streamlit và các script nhập dữ liệu.
+
+- WAL: người đọc không chặn người ghi và ngược lại (dashboard vẫn đọc khi đang nhập hàng loạt)
+- pool kết nối chỉ-đọc: mỗi lần chạy script Streamlit mượn một kết nối rồi trả lại
+- một kết nối ghi duy nhất, dùng tuần tự qua lock
+- PRAGMA synchronous/cache_size/mmap_size/temp_store chỉnh qua biến môi trường,
+  cache câu lệnh đã biên dịch (`cached_statements`) cho mỗi kết nối
+"""
+import os
+import queue
+import atexit
+import sqlite3
+import threading
+import contextlib
+
+DB_BUSY_TIMEOUT_S  = float(os.environ.get("DB_BUSY_TIMEOUT_S", 30))
+DB_SYNCHRONOUS     = os.environ.get("DB_SYNCHRONOUS", "NORMAL")          # an toàn với WAL, nhanh hơn FULL
+DB_CACHE_SIZE_KB   = int(os.environ.get("DB_CACHE_SIZE_KB", 64 * 1024))   # page cache mỗi kết nối
+DB_MMAP_SIZE       = int(os.environ.get("DB_MMAP_SIZE", 256 * 1024 * 1024))
+DB_TEMP_STORE      = os.environ.get("DB_TEMP_STORE", "MEMORY")
+DB_STATEMENT_CACHE = int(os.environ.get("DB_STATEMENT_CACHE", 256))
+DB_READ_POOL       = int(os.environ.get("DB_READ_POOL", 4))               # số kết nối đọc giữ lại
+
+
+class ConnectionManager:
+    def __init__(self, db_file, read_pool=DB_READ_POOL):
+        self.db_file     = db_file
+        self._readers    = queue.LifoQueue(maxsize=max(1, read_pool))
+        self._write_lock = threading.RLock()
+        self._writer     = None
+        self._closed     = False
+        # bật WAL một lần (lưu trong file DB), trước khi có kết nối đọc nào
+        with self.writer() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        atexit.register(self.close)
+
+    def _connect(self, readonly):
+        conn = sqlite3.connect(self.db_file, timeout=DB_BUSY_TIMEOUT_S, check_same_thread=False,
+                               cached_statements=DB_STATEMENT_CACHE)
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        conn.execute(f"PRAGMA temp_store={DB_TEMP_STORE}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Mượn một kết nối chỉ-đọc từ pool (tạo mới nếu pool đang hết)."""
+        if self._closed:
+            raise sqlite3.ProgrammingError("ConnectionManager đã đóng")
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                if self._closed:
+                    raise queue.Full
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextlib.contextmanager
+    def writer(self):
+        """Kết nối ghi duy nhất, giữ lock trong suốt khối `with`; commit khi xong, rollback khi lỗi."""
+        with self._write_lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("ConnectionManager đã đóng")
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            conn = self._writer
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+
+    def close(self):
+        """Đóng mọi kết nối; kết nối đang được mượn sẽ bị đóng khi trả lại."""
+        self._closed = True
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
@@ -1,181 +1,418 @@
 # flask_api.py
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 import os
 import json
+import codecs
+import time
 import torch
-import torch.nn as nn
-import numpy as np
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
-from gensim.models import KeyedVectors
+import threading
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from admission import INTERACTIVE, BULK, PRIORITY_NAMES, PriorityGate, Overloaded, DeadlineExceeded, deadline_after
+from batching import MicroBatcher
+from model_registry import ModelRegistry, load_config, process_rss_bytes
+from inference_models import stub_config
+from cascade import cascade_config, uncertain_rows
+from prediction_cache import PredictionCache, cache_key, normalize_text
+from jobs import JobManager, SQLiteJobManager
+from metrics import (STAGE_SECONDS, MODEL_TEXTS, CASCADE_DECISIONS, QUEUE_DEPTH, ADMISSION_REJECTED,
+                     HTTP_REQUESTS, HTTP_REQUEST_SECONDS,
+                     CACHE_LOOKUPS, CACHE_ENTRIES, CACHE_HIT_RATIO, MODEL_LOADED, PROCESS_RSS_BYTES,
+                     CONTENT_TYPE, render as render_metrics)
 
 # --- Common setup ---
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-# --- PhoBERT-based model setup ---
-MODEL_NAME_PHO   = "vinai/phobert-base-v2"
-BEST_MODEL_PHO   = "best_vinai_phobert-base-v2_aspect_cateogry_analysis_sigmoid_prob.pth"
-LABEL_MAP_PHO    = "label_map.json"
-MAX_LEN_PHO      = 128
-THRESHOLD_PHO    = 0.48
-
-# load label map và đảo chỉ mục
-with open(LABEL_MAP_PHO, "r", encoding="utf-8") as f:
-    raw_map_pho = json.load(f)
-pho_label_map  = {tuple(k.split("###")): v for k, v in raw_map_pho.items()}
-pho_idx2label  = {v: k for k, v in pho_label_map.items()}
-
-# khởi tạo tokenizer + model
-tokenizer_pho = AutoTokenizer.from_pretrained(MODEL_NAME_PHO)
-model_pho     = AutoModelForSequenceClassification.from_pretrained(
-    MODEL_NAME_PHO, num_labels=len(pho_idx2label)
-).to(device)
-model_pho.load_state_dict(torch.load(BEST_MODEL_PHO, map_location=device))
-model_pho.eval()
+# Micro-batching: gom các request đồng thời thành một lần forward
+BATCH_MAX_SIZE    = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+# "longest": pad mỗi bucket tới câu dài nhất; "max_length": pad cố định như cũ
+PADDING_STRATEGY  = os.environ.get("PADDING_STRATEGY", "longest")
+MAX_BATCH_TEXTS   = int(os.environ.get("MAX_BATCH_TEXTS", 1000))
+
+# Engine suy luận: "torch" (PyTorch eager) hoặc "onnx" (onnxruntime CPU, cần chạy onnx_export.py trước)
+INFERENCE_ENGINE  = os.environ.get("INFERENCE_ENGINE", "torch")
+ORT_NUM_THREADS   = int(os.environ.get("ORT_NUM_THREADS", 0))
+# Độ chính xác cho engine torch: "fp32", "int8" (quantize động Linear/LSTM) hoặc "bf16" (autocast)
+MODEL_PRECISION   = os.environ.get("MODEL_PRECISION", "fp32")
+
+# Cache kết quả dự đoán; PREDICTION_CACHE_DB bật tầng SQLite dùng chung giữa các worker
+PREDICTION_CACHE_SIZE  = int(os.environ.get("PREDICTION_CACHE_SIZE", 100_000))
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", 7 * 24 * 3600))
+PREDICTION_CACHE_DB    = os.environ.get("PREDICTION_CACHE_DB") or None
+
+# Job phân tích file chạy nền
+JOB_WORKERS       = int(os.environ.get("JOB_WORKERS", 2))
+JOB_CHUNK_SIZE    = int(os.environ.get("JOB_CHUNK_SIZE", 64))
+MAX_JOB_LINES     = int(os.environ.get("MAX_JOB_LINES", 100_000))
+# JOB_DB: lưu job trong SQLite dùng chung để mọi worker của serve.py thấy cùng các job
+JOB_DB            = os.environ.get("JOB_DB") or None
+
+# Model giả chi phí cố định để đo overhead web/serialize khi không có checkpoint (--stub-models)
+STUB_MODELS       = os.environ.get("STUB_MODELS", "0") == "1"
+STUB_BATCH_MS     = float(os.environ.get("STUB_BATCH_MS", 5))
+STUB_TEXT_MS      = float(os.environ.get("STUB_TEXT_MS", 0.5))
+
+# Kiểm soát tải: số lượt chạy model đồng thời, giới hạn hàng đợi và deadline mặc định
+MODEL_CONCURRENCY   = int(os.environ.get("MODEL_CONCURRENCY", 1))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 256))   # câu đơn chờ trong mỗi batcher
+ADMISSION_MAX_BULK  = int(os.environ.get("ADMISSION_MAX_BULK", 8))      # request batch chờ mỗi model
+ADMISSION_CHUNK     = int(os.environ.get("ADMISSION_CHUNK", 64))        # câu mỗi lượt của request batch
+REQUEST_DEADLINE_MS = float(os.environ.get("REQUEST_DEADLINE_MS", 0))   # 0 = không giới hạn
+
+def model_config(stub=STUB_MODELS):
+    config = load_config()
+    return stub_config(config, STUB_BATCH_MS, STUB_TEXT_MS) if stub else config
+
+# --- Model registry: nạp model khi dùng lần đầu, mô tả trong models.json ---
+registry = ModelRegistry(model_config(), device, engine=INFERENCE_ENGINE, precision=MODEL_PRECISION,
+                         ort_threads=ORT_NUM_THREADS, batch_size=BATCH_MAX_SIZE)
+registry.load_eager()
+registry.start_sweeper()
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S, PREDICTION_CACHE_DB)
+
+def cache_keys(name, texts, padding=PADDING_STRATEGY):
+    """Chuẩn hoá câu theo model rồi tạo key cache (model, version|padding, câu); padding
+    đổi độ dài chuỗi đưa vào model nên là một phần của key."""
+    lowercase = registry.spec(name).get("lowercase", False)
+    version   = f"{registry.version(name)}|{padding}"
+    norm      = [normalize_text(t, lowercase) for t in texts]
+    return norm, [cache_key(name, version, t) for t in norm]
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+def gate(name):
+    """PriorityGate của model: câu đơn (INTERACTIVE) được chạy trước request batch/job (BULK)."""
+    with _gates_lock:
+        if name not in _gates:
+            _gates[name] = PriorityGate(name, MODEL_CONCURRENCY, {BULK: ADMISSION_MAX_BULK})
+        return _gates[name]
+
+def run_model(name, fn, items, priority=BULK, deadline=None, admit=True):
+    """Chạy fn trên items qua gate của model; phần BULK được chia lượt ADMISSION_CHUNK câu
+    để câu đơn chen vào giữa các lượt, và dừng khi deadline đã qua."""
+    step = len(items) if priority == INTERACTIVE else max(1, ADMISSION_CHUNK)
+    out  = []
+    for start in range(0, len(items), step):
+        # chỉ lượt đầu bị kiểm tra giới hạn hàng đợi; các lượt sau đã được nhận
+        with gate(name).slot(priority, deadline, admit and start == 0):
+            out.extend(fn(items[start:start + step]))
+    return out
+
+def predict_batch(name, texts, padding=PADDING_STRATEGY, bucket_size=BATCH_MAX_SIZE,
+                  priority=BULK, deadline=None, admit=True):
+    """Dự đoán qua cache: chỉ các câu (đã chuẩn hoá, không trùng) chưa có mới chạy model."""
+    norm, keys = cache_keys(name, texts, padding)
+    found   = prediction_cache.get_many(keys)
+    missing = {k: t for k, t in zip(keys, norm) if k not in found}
+    MODEL_TEXTS.inc(len(keys) - len(missing), model=name, source="cache")
+    MODEL_TEXTS.inc(len(missing), model=name, source="model")
+    if missing:
+        runtime = registry.get(name)
+        preds = run_model(name, lambda chunk: runtime.predict(chunk, padding, bucket_size),
+                          list(missing.values()), priority, deadline, admit)
+        computed = dict(zip(missing, preds))
+        prediction_cache.put_many(computed)
+        found.update(computed)
+    return [found[k] for k in keys]
+
+def cached_prediction(name, text):
+    """Kết quả trong cache cho một câu, None nếu chưa có. Không đếm lần trượt: câu trượt
+    đi tiếp qua batcher tới predict_batch, nơi được tra (và đếm) lại."""
+    _, keys = cache_keys(name, [text])
+    preds = prediction_cache.get_many(keys, count_misses=False).get(keys[0])
+    if preds is not None:
+        MODEL_TEXTS.inc(model=name, source="cache")
+    return preds
+
+def predict_pho_batch(texts, padding=PADDING_STRATEGY, bucket_size=BATCH_MAX_SIZE, **admission):
+    return predict_batch("phobert", texts, padding, bucket_size, **admission)
 
 def predict_pho(text: str):
-    inputs = tokenizer_pho(
-        text,
-        padding="max_length",
-        truncation=True,
-        max_length=MAX_LEN_PHO,
-        return_tensors="pt"
-    ).to(device)
-    with torch.no_grad():
-        logits = model_pho(**inputs).logits
-        probs  = torch.sigmoid(logits).squeeze(0).cpu()
-    pairs = [pho_idx2label[i] for i, p in enumerate(probs) if p > THRESHOLD_PHO]
-    return [{"aspect": asp, "sentiment": sen} for asp, sen in pairs]
-
-
-# --- CNN–LSTM–Attention model setup ---
-# Hyperparameters must match those used in training
-EMBEDDING_DIM      = 100
-HIDDEN_DIM         = 128
-NUM_HEADS          = 4
-NUM_FILTERS        = 100
-KERNEL_SIZES       = [2, 3, 4]
-DROPOUT            = 0.4
-ARTIFACTS_DIR_CNN  = "cnn_lstm_attention_component"
-PAD_TOKEN          = "<pad>"
-UNK_TOKEN          = "<unk>"
-MAX_LEN_CNN        = 80
-THRESHOLD_CNN      = 0.5
-
-class CNNBiLSTM_MHA_ACSA(nn.Module):
-    def __init__(self, vocab_size, embedding_dim, num_filters, kernel_sizes,
-                 hidden_dim, num_heads, output_dim, dropout, pad_idx,
-                 pretrained_matrix=None, freeze_embeddings=False):
-        super().__init__()
-        self.embedding = nn.Embedding(vocab_size, embedding_dim, padding_idx=pad_idx)
-        if pretrained_matrix is not None:
-            self.embedding.weight.data.copy_(pretrained_matrix)
-            self.embedding.weight.requires_grad = not freeze_embeddings
-        self.convs = nn.ModuleList([
-            nn.Conv1d(embedding_dim, num_filters, ks) for ks in kernel_sizes
-        ])
-        self.lstm = nn.LSTM(num_filters, hidden_dim, batch_first=True, bidirectional=True)
-        self.attn = nn.MultiheadAttention(embed_dim=hidden_dim*2,
-                                          num_heads=num_heads,
-                                          dropout=dropout,
-                                          batch_first=True)
-        self.dropout = nn.Dropout(dropout)
-        self.fc      = nn.Linear(hidden_dim*2, output_dim)
-        self.pad_idx = pad_idx
-
-    def forward(self, text):
-        mask = (text == self.pad_idx)
-        emb  = self.dropout(self.embedding(text))
-        x    = emb.permute(0,2,1)
-        c    = torch.relu(self.convs[0](x)).permute(0,2,1)
-        out, _ = self.lstm(self.dropout(c))
-        # adjust mask length if needed
-        if out.size(1) != mask.size(1):
-            diff = out.size(1) - mask.size(1)
-            if diff > 0:
-                mask = torch.cat([mask, mask.new_ones(mask.size(0), diff)], dim=1)
-            else:
-                mask = mask[:, :out.size(1)]
-        attn_out, _ = self.attn(out, out, out, key_padding_mask=mask)
-        attn_out    = attn_out.masked_fill(mask.unsqueeze(-1), 0.0)
-        summed      = attn_out.sum(1)
-        cnt_nonpad  = (~mask).sum(1).clamp(min=1).unsqueeze(1)
-        pooled      = summed / cnt_nonpad
-        return self.fc(self.dropout(pooled))
-
-def load_cnn_artifacts(artifacts_dir=ARTIFACTS_DIR_CNN):
-    # vocab
-    with open(os.path.join(artifacts_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
-        vocab = json.load(f)
-    # label_map
-    raw_lm = json.load(open(os.path.join(artifacts_dir, 'label_map.json'), 'r', encoding='utf-8'))
-    label_map = {tuple(key.split('|||')): idx for key, idx in raw_lm.items()}
-    # idx_to_label
-    raw_itl = json.load(open(os.path.join(artifacts_dir, 'idx_to_label.json'), 'r', encoding='utf-8'))
-    idx_to_label = {int(k): tuple(v) for k, v in raw_itl.items()}
-    # Word2Vec
-    kv = KeyedVectors.load(os.path.join(artifacts_dir, 'word2vec.kv'), mmap='r')
-
-    # rebuild model
-    vocab_size = len(vocab)
-    num_classes= len(label_map)
-    pad_idx    = vocab[PAD_TOKEN]
-    model = CNNBiLSTM_MHA_ACSA(
-        vocab_size=vocab_size,
-        embedding_dim=EMBEDDING_DIM,
-        num_filters=NUM_FILTERS,
-        kernel_sizes=KERNEL_SIZES,
-        hidden_dim=HIDDEN_DIM,
-        num_heads=NUM_HEADS,
-        output_dim=num_classes,
-        dropout=DROPOUT,
-        pad_idx=pad_idx,
-        pretrained_matrix=None,
-        freeze_embeddings=False
-    ).to(device)
-    model.load_state_dict(torch.load(os.path.join(artifacts_dir, 'best_model.pt'),
-                                     map_location=device))
-    model.eval()
-    return model, vocab, idx_to_label
-
-cnn_model, cnn_vocab, cnn_idx2label = load_cnn_artifacts()
+    return predict_pho_batch([text])[0]
+
+def predict_cnn_batch(texts, padding=PADDING_STRATEGY, bucket_size=BATCH_MAX_SIZE, **admission):
+    return predict_batch("cnn", texts, padding, bucket_size, **admission)
 
 def predict_cnn(text: str):
-    # tokenize & pad
-    tokens = text.lower().split()
-    idxs = [cnn_vocab.get(w, cnn_vocab.get(UNK_TOKEN)) for w in tokens]
-    if len(idxs) < MAX_LEN_CNN:
-        idxs += [cnn_vocab[PAD_TOKEN]] * (MAX_LEN_CNN - len(idxs))
-    else:
-        idxs = idxs[:MAX_LEN_CNN]
-    tensor = torch.tensor([idxs], dtype=torch.long).to(device)
-    with torch.no_grad():
-        logits = cnn_model(tensor)
-        probs  = torch.sigmoid(logits).squeeze(0).cpu().numpy()
-    pairs = [cnn_idx2label[i] for i, p in enumerate(probs) if p > THRESHOLD_CNN]
-    return [{"aspect": asp, "sentiment": sen} for asp, sen in pairs]
+    return predict_cnn_batch([text])[0]
+
+def predict_cascade_batch(texts, padding=PADDING_STRATEGY, bucket_size=BATCH_MAX_SIZE,
+                          priority=BULK, deadline=None, admit=True):
+    """Cascade: model nhanh (CNN) trước, chỉ câu có nhãn nằm trong dải bất định mới chạy PhoBERT.
+
+    Trả về list {"predictions": [...], "model": tên model đã quyết định} theo thứ tự đầu vào.
+    """
+    cfg = cascade_config(registry.config)
+    fast, accurate, band = cfg["fast"], cfg["accurate"], cfg["band"]
+    version = f"{registry.version(fast)}:{registry.version(accurate)}:{band}|{padding}"
+    keys    = [cache_key("cascade", version, normalize_text(t)) for t in texts]
+    found   = prediction_cache.get_many(keys)
+    missing = {k: t for k, t in zip(keys, texts) if k not in found}
+    MODEL_TEXTS.inc(len(keys) - len(missing), model="cascade", source="cache")
+    MODEL_TEXTS.inc(len(missing), model="cascade", source="model")
+    if missing:
+        runtime   = registry.get(fast)
+        lowercase = registry.spec(fast).get("lowercase", False)
+        items     = list(missing.items())
+        probs     = run_model(fast, lambda chunk: runtime.predict_probs(chunk, padding, bucket_size),
+                              [normalize_text(t, lowercase) for _, t in items], priority, deadline, admit)
+        unsure    = uncertain_rows(probs, runtime.threshold, band)
+        computed  = {k: {"predictions": runtime.decode(row), "model": fast}
+                     for (k, _), row, u in zip(items, probs, unsure) if not u}
+        hard = [(k, t) for (k, t), u in zip(items, unsure) if u]
+        if hard:
+            preds = predict_batch(accurate, [t for _, t in hard], padding, bucket_size, priority, deadline, admit)
+            computed.update({k: {"predictions": p, "model": accurate} for (k, _), p in zip(hard, preds)})
+        CASCADE_DECISIONS.inc(len(items) - len(hard), model=fast)
+        CASCADE_DECISIONS.inc(len(hard), model=accurate)
+        prediction_cache.put_many(computed)
+        found.update(computed)
+    return [found[k] for k in keys]
+
+def predict_any(name, texts):
+    """Dùng cho job nền: `name` là model trong registry hoặc "cascade".
+
+    Job đã bị giới hạn bởi JOB_WORKERS nên chạy ở mức BULK mà không bị từ chối.
+    """
+    if name == "cascade":
+        return [r["predictions"] for r in predict_cascade_batch(texts, admit=False)]
+    return predict_batch(name, texts, admit=False)
+
+job_manager = (SQLiteJobManager(predict_any, JOB_DB, JOB_WORKERS, JOB_CHUNK_SIZE) if JOB_DB
+               else JobManager(predict_any, JOB_WORKERS, JOB_CHUNK_SIZE))
+
+# câu đơn đi qua batcher và chạy model ở mức INTERACTIVE
+pho_batcher = MicroBatcher(lambda texts: predict_pho_batch(texts, priority=INTERACTIVE),
+                           BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="pho-batcher", max_queue=ADMISSION_MAX_QUEUE)
+cnn_batcher = MicroBatcher(lambda texts: predict_cnn_batch(texts, priority=INTERACTIVE),
+                           BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="cnn-batcher", max_queue=ADMISSION_MAX_QUEUE)
+cascade_batcher = MicroBatcher(lambda texts: predict_cascade_batch(texts, priority=INTERACTIVE),
+                               BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name="cascade-batcher",
+                               max_queue=ADMISSION_MAX_QUEUE)
 
 
 # --- Flask App ---
 app = Flask(__name__)
 
+@app.before_request
+def start_timer():
+    g.start_time = time.perf_counter()
+    # deadline tính từ lúc request tới; client gửi qua header X-Request-Timeout-Ms
+    timeout_ms = request.headers.get("X-Request-Timeout-Ms", REQUEST_DEADLINE_MS, type=float)
+    g.deadline = deadline_after(timeout_ms)
+
+def remaining(deadline):
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+@app.errorhandler(Overloaded)
+def overloaded_error(e):
+    return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+
+@app.errorhandler(DeadlineExceeded)
+@app.errorhandler(FutureTimeout)
+def deadline_error(e):
+    return jsonify({"error": str(e) or "Deadline exceeded"}), 504
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if "start_time" in g:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - g.start_time, endpoint=endpoint)
+    return response
+
+def parse_json(model):
+    with STAGE_SECONDS.time(model=model, stage="json_parse"):
+        return request.get_json(force=True)
+
+def respond(model, payload):
+    with STAGE_SECONDS.time(model=model, stage="serialize"):
+        return jsonify(payload)
+
 @app.route("/predict_pho", methods=["POST"])
 def predict_pho_endpoint():
-    data = request.get_json(force=True)
+    data = parse_json("phobert")
     text = data.get("text", "").strip()
     if not text:
         return jsonify({"error": "Missing 'text'"}), 400
-    preds = predict_pho(text)
-    return jsonify({"predictions": preds})
+    preds = cached_prediction("phobert", text)
+    if preds is None:
+        preds = pho_batcher.submit(text, remaining(g.deadline), g.deadline)
+    return respond("phobert", {"predictions": preds})
 
 @app.route("/predict_cnn", methods=["POST"])
 def predict_cnn_endpoint():
-    data = request.get_json(force=True)
+    data = parse_json("cnn")
     text = data.get("text", "").strip()
     if not text:
         return jsonify({"error": "Missing 'text'"}), 400
-    preds = predict_cnn(text)
-    return jsonify({"predictions": preds})
+    preds = cached_prediction("cnn", text)
+    if preds is None:
+        preds = cnn_batcher.submit(text, remaining(g.deadline), g.deadline)
+    return respond("cnn", {"predictions": preds})
+
+@app.route("/predict_cascade", methods=["POST"])
+def predict_cascade_endpoint():
+    """Như /predict_cnn nhưng câu CNN không chắc chắn được PhoBERT quyết định; `model` cho biết model nào."""
+    data = parse_json("cascade")
+    text = data.get("text", "").strip()
+    if not text:
+        return jsonify({"error": "Missing 'text'"}), 400
+    result = cascade_batcher.submit(text, remaining(g.deadline), g.deadline)
+    return respond("cascade", result)
+
+@app.route("/models", methods=["GET"])
+def models_endpoint():
+    return jsonify(registry.status())
+
+@app.route("/cache", methods=["GET"])
+def cache_endpoint():
+    return jsonify(prediction_cache.stats())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Số liệu Prometheus của process hiện tại."""
+    QUEUE_DEPTH.set(pho_batcher.qsize(), queue="pho-batcher")
+    QUEUE_DEPTH.set(cnn_batcher.qsize(), queue="cnn-batcher")
+    QUEUE_DEPTH.set(cascade_batcher.qsize(), queue="cascade-batcher")
+    QUEUE_DEPTH.set(job_manager.qsize(), queue="jobs")
+    with _gates_lock:
+        gates = list(_gates.values())
+    for gt in gates:
+        stats = gt.stats()
+        for prio in PRIORITY_NAMES.values():
+            QUEUE_DEPTH.set(stats["waiting"].get(prio, 0), queue=f"{gt.name}-{prio}")
+            ADMISSION_REJECTED.set(stats["rejected"].get(prio, 0), queue=f"{gt.name}-{prio}")
+    stats = prediction_cache.stats()
+    CACHE_LOOKUPS.set(stats["hits_memory"], result="hit_memory")
+    CACHE_LOOKUPS.set(stats["hits_sqlite"], result="hit_sqlite")
+    CACHE_LOOKUPS.set(stats["misses"], result="miss")
+    CACHE_ENTRIES.set(stats["entries"])
+    CACHE_HIT_RATIO.set(stats["hit_rate"])
+    for model in registry.status()["models"]:
+        MODEL_LOADED.set(int(model["loaded"]), model=model["name"])
+    rss = process_rss_bytes()
+    if rss:
+        PROCESS_RSS_BYTES.set(rss)
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+def read_texts(data):
+    texts = data.get("texts") if isinstance(data, dict) else None
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        return None, (jsonify({"error": "Missing 'texts' (list of strings)"}), 400)
+    if len(texts) > MAX_BATCH_TEXTS:
+        return None, (jsonify({"error": f"Too many texts (max {MAX_BATCH_TEXTS})"}), 413)
+    return [t.strip() for t in texts], None
+
+def predict_texts(texts, predict_batch_fn, empty=list):
+    # câu rỗng trả về empty() (mặc định danh sách rỗng), giữ nguyên thứ tự đầu vào
+    idx   = [i for i, t in enumerate(texts) if t]
+    preds = predict_batch_fn([texts[i] for i in idx], deadline=g.deadline) if idx else []
+    out   = [empty() for _ in texts]
+    for i, p in zip(idx, preds):
+        out[i] = p
+    return out
+
+@app.route("/predict_pho_batch", methods=["POST"])
+def predict_pho_batch_endpoint():
+    texts, err = read_texts(parse_json("phobert"))
+    if err:
+        return err
+    return respond("phobert", {"predictions": predict_texts(texts, predict_pho_batch)})
+
+@app.route("/predict_cnn_batch", methods=["POST"])
+def predict_cnn_batch_endpoint():
+    texts, err = read_texts(parse_json("cnn"))
+    if err:
+        return err
+    return respond("cnn", {"predictions": predict_texts(texts, predict_cnn_batch)})
+
+@app.route("/predict_cascade_batch", methods=["POST"])
+def predict_cascade_batch_endpoint():
+    texts, err = read_texts(parse_json("cascade"))
+    if err:
+        return err
+    results = predict_texts(texts, predict_cascade_batch, empty=lambda: {"predictions": [], "model": None})
+    return respond("cascade", {"predictions": [r["predictions"] for r in results],
+                               "models":      [r["model"] for r in results]})
+
+# --- Job API: phân tích file dài ở nền ---
+def decode_upload(raw):
+    """Text của file tải lên: UTF-8 (có/không BOM) hoặc UTF-16 có BOM (Notepad); None nếu không đọc được."""
+    encoding = "utf-16" if raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)) else "utf-8-sig"
+    try:
+        return raw.decode(encoding)
+    except UnicodeDecodeError:
+        return None
+
+@app.route("/jobs", methods=["POST"])
+def create_job_endpoint():
+    if "file" in request.files:
+        model = request.form.get("model", "phobert")
+        text  = decode_upload(request.files["file"].read())
+        if text is None:
+            return jsonify({"error": "Unsupported file encoding (expected UTF-8 or UTF-16 with BOM)"}), 400
+        lines = text.splitlines()
+    else:
+        data  = request.get_json(force=True, silent=True) or {}
+        model = data.get("model", "phobert")
+        lines = data.get("lines")
+        if not isinstance(lines, list) or not all(isinstance(l, str) for l in lines):
+            return jsonify({"error": "Missing 'lines' (list of strings) or 'file'"}), 400
+    if model not in registry.names() and model != "cascade":
+        return jsonify({"error": f"Unknown model '{model}'"}), 400
+    lines = [l.strip() for l in lines if l.strip()]
+    if not lines:
+        return jsonify({"error": "No non-empty lines"}), 400
+    if len(lines) > MAX_JOB_LINES:
+        return jsonify({"error": f"Too many lines (max {MAX_JOB_LINES})"}), 413
+    job = job_manager.submit(model, lines)
+    return jsonify(job.info()), 202, {"Location": f"/jobs/{job.id}"}
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job_endpoint(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.info())
+
+@app.route("/jobs/<job_id>/results", methods=["GET"])
+def job_results_endpoint(job_id):
+    """Stream NDJSON các kết quả đã xong; `follow=1` giữ kết nối tới khi job kết thúc."""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    offset = request.args.get("offset", 0, type=int)
+    follow = request.args.get("follow", "0") in ("1", "true")
+
+    def generate():
+        for i, text, preds in job_manager.iter_results(job, offset, follow):
+            yield json.dumps({"index": i, "text": text, "predictions": preds}, ensure_ascii=False) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job_endpoint(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job.info())
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Flask host cho PhoBERT và CNN–LSTM–Attention")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--no-debug", action="store_true", help="Tắt debug/reloader (nên dùng khi đo tải)")
+    parser.add_argument("--stub-models", action="store_true",
+                        help="Dùng model giả chi phí cố định (STUB_BATCH_MS/STUB_TEXT_MS) thay cho model thật")
+    args = parser.parse_args()
+    if args.stub_models and not STUB_MODELS:
+        registry.reconfigure(model_config(stub=True))
+
     # khi deploy, cân nhắc dùng gunicorn/uWSGI thay debug=True
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # threaded=True để các request đồng thời được gom batch
+    app.run(host=args.host, port=args.port, debug=not args.no_debug, threaded=True)
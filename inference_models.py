@@ -0,0 +1,477 @@
+# inference_models.py
+import os
+import json
+import time
+import hashlib
+import warnings
+import contextlib
+from itertools import chain, repeat
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+import onnx_backend
+from batching import length_buckets
+from metrics import STAGE_SECONDS, MODEL_BATCH_SIZE
+from quantization import apply_precision, precision_context
+
+# --- CNN–LSTM–Attention ---
+# Hyperparameters must match those used in training
+EMBEDDING_DIM      = 100
+HIDDEN_DIM         = 128
+NUM_HEADS          = 4
+NUM_FILTERS        = 100
+KERNEL_SIZES       = [2, 3, 4]
+DROPOUT            = 0.4
+PAD_TOKEN          = "<pad>"
+UNK_TOKEN          = "<unk>"
+CNN_PAD_MARGIN     = int(os.environ.get("CNN_PAD_MARGIN", 32))
+
+
+class CNNBiLSTM_MHA_ACSA(nn.Module):
+    def __init__(self, vocab_size, embedding_dim, num_filters, kernel_sizes,
+                 hidden_dim, num_heads, output_dim, dropout, pad_idx,
+                 pretrained_matrix=None, freeze_embeddings=False):
+        super().__init__()
+        self.embedding = nn.Embedding(vocab_size, embedding_dim, padding_idx=pad_idx)
+        if pretrained_matrix is not None:
+            self.embedding.weight.data.copy_(pretrained_matrix)
+            self.embedding.weight.requires_grad = not freeze_embeddings
+        self.convs = nn.ModuleList([
+            nn.Conv1d(embedding_dim, num_filters, ks) for ks in kernel_sizes
+        ])
+        self.lstm = nn.LSTM(num_filters, hidden_dim, batch_first=True, bidirectional=True)
+        self.attn = nn.MultiheadAttention(embed_dim=hidden_dim*2,
+                                          num_heads=num_heads,
+                                          dropout=dropout,
+                                          batch_first=True)
+        self.dropout = nn.Dropout(dropout)
+        self.fc      = nn.Linear(hidden_dim*2, output_dim)
+        self.pad_idx = pad_idx
+
+    def forward(self, text):
+        mask = (text == self.pad_idx)
+        emb  = self.dropout(self.embedding(text))
+        x    = emb.permute(0,2,1)
+        c    = torch.relu(self.convs[0](x)).permute(0,2,1)
+        out, _ = self.lstm(self.dropout(c))
+        # adjust mask length if needed
+        if out.size(1) != mask.size(1):
+            diff = out.size(1) - mask.size(1)
+            if diff > 0:
+                mask = torch.cat([mask, mask.new_ones(mask.size(0), diff)], dim=1)
+            else:
+                mask = mask[:, :out.size(1)]
+        attn_out, _ = self.attn(out, out, out, key_padding_mask=mask)
+        attn_out    = attn_out.masked_fill(mask.unsqueeze(-1), 0.0)
+        summed      = attn_out.sum(1)
+        cnt_nonpad  = (~mask).sum(1).clamp(min=1).unsqueeze(1)
+        pooled      = summed / cnt_nonpad
+        return self.fc(self.dropout(pooled))
+
+
+class CNNInferenceModel(nn.Module):
+    """Bản suy luận của CNNBiLSTM_MHA_ACSA: chỉ giữ các module thực sự dùng
+    (convs[0]) và tự tính multi-head attention để export ONNX với batch/độ dài động.
+    Kết quả trùng với `CNNBiLSTM_MHA_ACSA.forward` ở chế độ eval."""
+
+    def __init__(self, model: CNNBiLSTM_MHA_ACSA):
+        super().__init__()
+        self.embedding   = model.embedding
+        self.conv        = model.convs[0]
+        self.lstm        = model.lstm
+        self.in_proj     = nn.Linear(model.attn.embed_dim, 3 * model.attn.embed_dim)
+        self.in_proj.weight.data.copy_(model.attn.in_proj_weight.data)
+        self.in_proj.bias.data.copy_(model.attn.in_proj_bias.data)
+        self.out_proj    = model.attn.out_proj
+        self.fc          = model.fc
+        self.num_heads   = model.attn.num_heads
+        self.kernel_size = model.convs[0].kernel_size[0]
+        self.pad_idx     = model.pad_idx
+
+    def forward(self, text):
+        x      = self.embedding(text).permute(0, 2, 1)
+        c      = torch.relu(self.conv(x)).permute(0, 2, 1)
+        out, _ = self.lstm(c)
+        # đầu ra conv ngắn hơn đầu vào (kernel_size - 1) vị trí
+        mask   = text[:, :text.size(1) - self.kernel_size + 1] == self.pad_idx
+        bsz, seq_len, embed_dim = out.shape
+        head_dim = embed_dim // self.num_heads
+        q, k, v  = self.in_proj(out).chunk(3, dim=-1)
+        q = q.reshape(bsz, seq_len, self.num_heads, head_dim).transpose(1, 2)
+        k = k.reshape(bsz, seq_len, self.num_heads, head_dim).transpose(1, 2)
+        v = v.reshape(bsz, seq_len, self.num_heads, head_dim).transpose(1, 2)
+        scores   = torch.matmul(q, k.transpose(-2, -1)) / (head_dim ** 0.5)
+        scores   = scores.masked_fill(mask[:, None, None, :], float("-inf"))
+        attn_out = torch.matmul(torch.softmax(scores, dim=-1), v)
+        attn_out = self.out_proj(attn_out.transpose(1, 2).reshape(bsz, seq_len, embed_dim))
+        attn_out = attn_out.masked_fill(mask.unsqueeze(-1), 0.0)
+        pooled   = attn_out.sum(1) / (~mask).sum(1).clamp(min=1).unsqueeze(1)
+        return self.fc(pooled)
+
+
+def compile_cnn(model, precision, device, script=True):
+    """Model suy luận của CNN: CNNInferenceModel + precision, biên dịch TorchScript nếu được."""
+    net = apply_precision(CNNInferenceModel(model).eval(), precision, device)
+    if not script or precision == "bf16":
+        # autocast bf16 không áp dụng trọn vẹn bên trong TorchScript nên giữ eager
+        return net
+    try:
+        with warnings.catch_warnings():
+            # torch mới báo torch.jit đã deprecated nhưng vẫn là cách nhanh nhất ở đây
+            warnings.simplefilter("ignore", FutureWarning)
+            return torch.jit.script(net)
+    except Exception as e:
+        warnings.warn(f"Không biên dịch được TorchScript cho CNN, dùng eager: {e}")
+        return net
+
+
+def load_cnn_artifacts(artifacts_dir, device):
+    # vocab
+    with open(os.path.join(artifacts_dir, 'vocab.json'), 'r', encoding='utf-8') as f:
+        vocab = json.load(f)
+    # label_map
+    raw_lm = json.load(open(os.path.join(artifacts_dir, 'label_map.json'), 'r', encoding='utf-8'))
+    label_map = {tuple(key.split('|||')): idx for key, idx in raw_lm.items()}
+    # idx_to_label
+    raw_itl = json.load(open(os.path.join(artifacts_dir, 'idx_to_label.json'), 'r', encoding='utf-8'))
+    idx_to_label = {int(k): tuple(v) for k, v in raw_itl.items()}
+    # word2vec.kv chỉ dùng lúc train (embedding đã nằm trong best_model.pt) nên không nạp
+
+    # rebuild model
+    vocab_size = len(vocab)
+    num_classes= len(label_map)
+    pad_idx    = vocab[PAD_TOKEN]
+    model = CNNBiLSTM_MHA_ACSA(
+        vocab_size=vocab_size,
+        embedding_dim=EMBEDDING_DIM,
+        num_filters=NUM_FILTERS,
+        kernel_sizes=KERNEL_SIZES,
+        hidden_dim=HIDDEN_DIM,
+        num_heads=NUM_HEADS,
+        output_dim=num_classes,
+        dropout=DROPOUT,
+        pad_idx=pad_idx,
+        pretrained_matrix=None,
+        freeze_embeddings=False
+    ).to(device)
+    model.load_state_dict(torch.load(os.path.join(artifacts_dir, 'best_model.pt'),
+                                     map_location=device))
+    model.eval()
+    return model, vocab, idx_to_label
+
+
+def decode_probs(probs, idx2label, threshold):
+    pairs = [idx2label[i] for i, p in enumerate(probs) if p > threshold]
+    return [{"aspect": asp, "sentiment": sen} for asp, sen in pairs]
+
+
+def pad_ids(ids_list, length, pad_idx):
+    """Ma trận (n, length) các id pad bên phải, điền bằng một phép gán có mask; trả kèm độ dài."""
+    lengths = np.fromiter(map(len, ids_list), dtype=np.int64, count=len(ids_list))
+    batch   = np.full((len(ids_list), length), pad_idx, dtype=np.int64)
+    batch[np.arange(length) < lengths[:, None]] = np.concatenate(ids_list)
+    return batch, lengths
+
+
+def module_nbytes(module):
+    return sum(t.numel() * t.element_size()
+               for t in list(module.parameters()) + list(module.buffers()))
+
+
+# ======================= RUNTIME =======================
+
+class ModelRuntime:
+    """Một model đã nạp, cùng tokenizer/ngưỡng/engine của nó.
+
+    Luồng suy luận: encode(texts) -> collate(ids, padding) -> run(batch) -> decode(probs).
+    """
+
+    kind = None
+
+    def __init__(self, name, spec, device, engine="torch", precision="fp32", ort_threads=0,
+                 source_version=None):
+        self.name        = name
+        self.spec        = spec
+        self.device      = device
+        self.engine      = engine
+        self.precision   = precision
+        self.ort_threads = ort_threads
+        # version của checkpoint PyTorch fp32, phải khớp với manifest ONNX mới dùng session
+        self.source_version = source_version
+        self.max_length  = int(spec["max_length"])
+        self.threshold   = float(spec["threshold"])
+        self.idx2label   = {}
+        self.model       = None
+        self.session     = None
+        self.session_bytes = 0
+        self.record      = True   # ghi metric; tắt trong lúc warmup
+
+    # --- vòng đời ---
+    def load_tokenizer(self):
+        """Chỉ nạp tokenizer/vocab và nhãn (không nạp trọng số), đủ để gọi encode()."""
+        raise NotImplementedError
+
+    def load(self):
+        raise NotImplementedError
+
+    def memory_bytes(self):
+        return 0
+
+    def token_vocab(self):
+        return {}
+
+    def tokenizer_version(self):
+        """Hash của những gì quyết định kết quả encode() (vocab, max_length, lowercase)."""
+        h = hashlib.sha1(json.dumps([self.kind, self.max_length, self.spec.get("lowercase", False)]).encode("utf-8"))
+        h.update(json.dumps(sorted(self.token_vocab().items()), ensure_ascii=False).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    # --- suy luận ---
+    def encode(self, texts):
+        raise NotImplementedError
+
+    def collate(self, ids_list, padding):
+        raise NotImplementedError
+
+    def run(self, batch):
+        raise NotImplementedError
+
+    def decode(self, probs):
+        return decode_probs(probs, self.idx2label, self.threshold)
+
+    def stage(self, name):
+        """Đo thời gian một bước suy luận vào histogram model_stage_seconds."""
+        if not self.record:
+            return contextlib.nullcontext()
+        return STAGE_SECONDS.time(model=self.name, stage=name)
+
+    def predict_probs_encoded(self, encoded, padding, bucket_size):
+        """Xác suất (n, num_labels) theo đúng thứ tự đầu vào, chạy theo bucket độ dài."""
+        probs = np.zeros((len(encoded), len(self.idx2label)), dtype=np.float32)
+        for bucket in length_buckets([len(x) for x in encoded], bucket_size):
+            with self.stage("collate"):
+                batch = self.collate([encoded[i] for i in bucket], padding)
+            if self.record:
+                MODEL_BATCH_SIZE.observe(len(bucket), model=self.name)
+            probs[bucket] = self.run(batch)
+        return probs
+
+    def predict_probs(self, texts, padding, bucket_size):
+        with self.stage("tokenize"):
+            encoded = self.encode(texts)
+        return self.predict_probs_encoded(encoded, padding, bucket_size)
+
+    def predict(self, texts, padding, bucket_size):
+        probs = self.predict_probs(texts, padding, bucket_size)
+        with self.stage("threshold"):
+            return [self.decode(row) for row in probs]
+
+    def warmup(self, batch_size, batches=1):
+        """Chạy vài batch giả với độ dài ngắn/dài để lần gọi thật đầu tiên không bị chậm."""
+        short = "giảng viên nhiệt tình"
+        long  = " ".join(["tài liệu đầy đủ giảng bài dễ hiểu"] * 6)
+        self.record = False
+        try:
+            for _ in range(max(0, batches)):
+                for size in sorted({1, max(1, batch_size)}):
+                    self.predict_probs([short] * size, "longest", batch_size)
+                    self.predict_probs([long] * size, "longest", batch_size)
+        finally:
+            self.record = True
+
+    def _load_session(self, onnx_name):
+        if self.engine == "onnx":
+            self.session, self.session_bytes = onnx_backend.load_session(
+                onnx_name, self.source_version, num_threads=self.ort_threads)
+
+    def _run_session(self, feeds):
+        with self.stage("forward"):
+            logits = self.session.run(["logits"], feeds)[0]
+        with self.stage("sigmoid"):
+            return onnx_backend.sigmoid(logits)
+
+    def _run_torch(self, model, inputs):
+        with self.stage("h2d"):
+            if isinstance(inputs, dict):
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            else:
+                inputs = inputs.to(self.device)
+        with torch.no_grad(), precision_context(self.precision, self.device):
+            with self.stage("forward"):
+                logits = model(**inputs) if isinstance(inputs, dict) else model(inputs)
+                logits = getattr(logits, "logits", logits)
+                if self.device.type == "cuda":
+                    # CUDA chạy bất đồng bộ: đợi forward xong để thời gian không bị tính sang bước sau
+                    torch.cuda.synchronize(self.device)
+            with self.stage("sigmoid"):
+                return torch.sigmoid(logits.float()).cpu().numpy()
+
+
+class PhoBertRuntime(ModelRuntime):
+    kind = "phobert"
+
+    def load_tokenizer(self):
+        from transformers import AutoTokenizer
+
+        # load label map và đảo chỉ mục
+        with open(self.spec["label_map"], "r", encoding="utf-8") as f:
+            raw_map = json.load(f)
+        label_map      = {tuple(k.split("###")): v for k, v in raw_map.items()}
+        self.idx2label = {v: k for k, v in label_map.items()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.spec["pretrained"])
+        return self
+
+    def load(self):
+        from transformers import AutoModelForSequenceClassification
+
+        # khởi tạo tokenizer + model; có session ONNX thì không nạp trọng số PyTorch (tránh giữ hai bản)
+        self.load_tokenizer()
+        self._load_session("phobert")
+        if self.session is not None:
+            return self
+        model = AutoModelForSequenceClassification.from_pretrained(
+            self.spec["pretrained"], num_labels=len(self.idx2label)
+        ).to(self.device)
+        model.load_state_dict(torch.load(self.spec["checkpoint"], map_location=self.device))
+        model.eval()
+        self.model = apply_precision(model, self.precision, self.device)
+        return self
+
+    def memory_bytes(self):
+        return self.session_bytes if self.session is not None else module_nbytes(self.model)
+
+    def token_vocab(self):
+        return self.tokenizer.get_vocab()
+
+    def encode(self, texts):
+        return self.tokenizer(list(texts), truncation=True, max_length=self.max_length)["input_ids"]
+
+    def collate(self, ids_list, padding):
+        if self.tokenizer.padding_side != "right":
+            return self.tokenizer.pad({"input_ids": [list(x) for x in ids_list]}, padding=padding,
+                                      max_length=self.max_length, return_tensors="pt")
+        # pad bằng numpy thay cho tokenizer.pad: nhận cả list lẫn mảng id (vd. từ corpus store)
+        length = self.max_length if padding == "max_length" else max(len(x) for x in ids_list)
+        ids, lengths = pad_ids(ids_list, length, self.tokenizer.pad_token_id)
+        mask = (np.arange(length) < lengths[:, None]).astype(np.int64)
+        return {"input_ids": torch.from_numpy(ids), "attention_mask": torch.from_numpy(mask)}
+
+    def run(self, batch):
+        if self.session is not None:
+            return self._run_session({
+                "input_ids":      batch["input_ids"].numpy(),
+                "attention_mask": batch["attention_mask"].numpy(),
+            })
+        return self._run_torch(self.model, batch)
+
+
+class CNNRuntime(ModelRuntime):
+    kind = "cnn"
+
+    def load_tokenizer(self):
+        with open(os.path.join(self.spec["artifacts_dir"], "vocab.json"), "r", encoding="utf-8") as f:
+            self.vocab = json.load(f)
+        with open(os.path.join(self.spec["artifacts_dir"], "idx_to_label.json"), "r", encoding="utf-8") as f:
+            self.idx2label = {int(k): tuple(v) for k, v in json.load(f).items()}
+        self.pad_idx = self.vocab[PAD_TOKEN]
+        self.unk_idx = self.vocab.get(UNK_TOKEN)
+        return self
+
+    def load(self):
+        # có session ONNX thì chỉ cần vocab/nhãn, không nạp trọng số PyTorch
+        self.net = None
+        self.load_tokenizer()
+        self._load_session("cnn")
+        if self.session is not None:
+            return self
+        # self.model giữ bản fp32 gốc (dùng cho export ONNX), self.net là bản chạy suy luận
+        self.model, self.vocab, self.idx2label = load_cnn_artifacts(self.spec["artifacts_dir"], self.device)
+        self.net     = compile_cnn(self.model, self.precision, self.device,
+                                   script=self.spec.get("torchscript", True))
+        return self
+
+    def memory_bytes(self):
+        return self.session_bytes if self.session is not None else module_nbytes(self.net)
+
+    def token_vocab(self):
+        return self.vocab
+
+    def encode(self, texts):
+        """Tokenize (chưa pad) cả batch: tra vocab một lượt cho mọi token, trả về mảng id mỗi câu."""
+        if not len(texts):
+            return []
+        tokens  = [t.lower().split()[:self.max_length] for t in texts]
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=len(tokens))
+        ids     = np.fromiter(map(self.vocab.get, chain.from_iterable(tokens), repeat(self.unk_idx)),
+                              dtype=np.int64, count=int(lengths.sum()))
+        return np.split(ids, np.cumsum(lengths)[:-1])
+
+    def collate(self, ids_list, padding):
+        if padding == "max_length":
+            length = self.max_length
+        else:
+            # BiLSTM chiều ngược đọc cả các vị trí pad, nên giữ thêm CNN_PAD_MARGIN pad
+            # để trạng thái hội tụ như khi pad cố định tới max_length
+            longest = max((len(x) for x in ids_list), default=0)
+            length  = min(self.max_length, longest + CNN_PAD_MARGIN)
+            length  = max(length, KERNEL_SIZES[0])
+        return torch.from_numpy(pad_ids(ids_list, length, self.pad_idx)[0])
+
+    def run(self, batch):
+        if self.session is not None:
+            return self._run_session({"input_ids": batch.numpy()})
+        return self._run_torch(self.net, batch)
+
+
+class StubRuntime(ModelRuntime):
+    """Model giả với chi phí cố định (`batch_ms` mỗi batch + `text_ms` mỗi câu), không cần checkpoint.
+
+    Dùng để đo riêng overhead web/serialize/batching (xem `--stub-models`).
+    """
+    kind = "stub"
+
+    LABELS = [("General review", "negative"), ("General review", "neutral"), ("General review", "positive")]
+
+    def load_tokenizer(self):
+        self.idx2label = dict(enumerate(self.LABELS))
+        return self
+
+    def load(self):
+        self.load_tokenizer()
+        self.batch_s   = float(self.spec.get("batch_ms", 5.0)) / 1000
+        self.text_s    = float(self.spec.get("text_ms", 0.5)) / 1000
+        return self
+
+    def encode(self, texts):
+        return [[len(t)] * min(len(t.split()), self.max_length) for t in texts]
+
+    def collate(self, ids_list, padding):
+        return ids_list
+
+    def run(self, batch):
+        with self.stage("forward"):
+            # sleep nhả GIL giống như các op của torch
+            time.sleep(self.batch_s + self.text_s * len(batch))
+        probs = np.zeros((len(batch), len(self.LABELS)), dtype=np.float32)
+        # nhãn cố định theo độ dài câu để kết quả lặp lại được
+        probs[np.arange(len(batch)), [(x[0] if x else 0) % len(self.LABELS) for x in batch]] = 1.0
+        return probs
+
+
+def stub_config(config, batch_ms, text_ms):
+    """Config thay mọi model bằng StubRuntime, giữ max_length/threshold/lowercase."""
+    return dict(config, models={
+        name: {"type": StubRuntime.kind, "max_length": spec["max_length"], "threshold": spec["threshold"],
+               "lowercase": spec.get("lowercase", False), "warmup_batches": 0,
+               "batch_ms": batch_ms, "text_ms": text_ms}
+        for name, spec in config["models"].items()
+    })
+
+
+RUNTIMES = {
+    PhoBertRuntime.kind: PhoBertRuntime,
+    CNNRuntime.kind:     CNNRuntime,
+    StubRuntime.kind:    StubRuntime,
+}
@@ -0,0 +1,393 @@
+# jobs.py
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import threading
+import contextlib
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    def __init__(self, model, lines):
+        self.id          = uuid.uuid4().hex
+        self.model       = model
+        self.lines       = lines
+        self.results     = [None] * len(lines)
+        self.processed   = 0
+        self.status      = QUEUED
+        self.error       = None
+        self.created_at  = time.time()
+        self.started_at  = None
+        self.finished_at = None
+        self.cancelled   = threading.Event()
+        self.updated     = threading.Condition()
+
+    def info(self):
+        total = len(self.lines)
+        return {
+            "id":          self.id,
+            "model":       self.model,
+            "status":      self.status,
+            "total":       total,
+            "processed":   self.processed,
+            "progress":    self.processed / total if total else 1.0,
+            "error":       self.error,
+            "created_at":  self.created_at,
+            "started_at":  self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    """Hàng đợi job phân tích file, xử lý nền theo từng chunk bởi một pool thread.
+
+    `predict_fn(model, texts)` trả về list dự đoán cùng thứ tự với `texts`.
+    """
+
+    def __init__(self, predict_fn, workers=2, chunk_size=64, finished_ttl_s=3600):
+        self.predict_fn     = predict_fn
+        self.workers        = max(1, int(workers))
+        self.chunk_size     = max(1, int(chunk_size))
+        self.finished_ttl_s = finished_ttl_s
+        self.jobs           = {}
+        self._lock          = threading.Lock()
+        self._queue         = queue.Queue()
+        self._threads       = []
+        self._pid           = None
+
+    def _ensure_started(self):
+        # thread không sống sót qua fork nên khởi động lại theo pid
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid     = os.getpid()
+            self._queue   = queue.Queue()
+            self._threads = [threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            for t in self._threads:
+                t.start()
+
+    def submit(self, model, lines):
+        self._ensure_started()
+        self._prune()
+        job = Job(model, lines)
+        with self._lock:
+            self.jobs[job.id] = job
+        self._queue.put(job.id)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancelled.set()
+        with job.updated:
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+        return job
+
+    def iter_results(self, job, offset=0, follow=False, timeout_s=1.0):
+        """Sinh (index, text, predictions) theo thứ tự; `follow` chờ tới khi job kết thúc."""
+        i = offset
+        while True:
+            with job.updated:
+                while i >= job.processed and follow and job.status not in FINISHED:
+                    job.updated.wait(timeout_s)
+                ready = job.processed
+            while i < ready:
+                yield i, job.lines[i], job.results[i]
+                i += 1
+            if not follow or job.status in FINISHED and i >= job.processed:
+                return
+
+    def _finish(self, job, status, error=None):
+        job.status      = status
+        job.error       = error
+        job.finished_at = time.time()
+        job.updated.notify_all()
+
+    def _loop(self):
+        while True:
+            job = self.get(self._queue.get())
+            if job is None or job.status != QUEUED:
+                continue
+            with job.updated:
+                job.status     = RUNNING
+                job.started_at = time.time()
+            try:
+                for start in range(0, len(job.lines), self.chunk_size):
+                    if job.cancelled.is_set():
+                        break
+                    chunk = job.lines[start:start + self.chunk_size]
+                    preds = self.predict_fn(job.model, chunk)
+                    with job.updated:
+                        job.results[start:start + len(chunk)] = preds
+                        job.processed = start + len(chunk)
+                        job.updated.notify_all()
+                with job.updated:
+                    self._finish(job, CANCELLED if job.cancelled.is_set() else DONE)
+            except Exception as e:
+                with job.updated:
+                    self._finish(job, FAILED, str(e))
+
+    def _prune(self):
+        # bỏ các job đã kết thúc quá lâu để không giữ kết quả mãi trong bộ nhớ
+        now = time.time()
+        with self._lock:
+            for job_id in [j.id for j in self.jobs.values()
+                           if j.finished_at and now - j.finished_at > self.finished_ttl_s]:
+                del self.jobs[job_id]
+
+
+class StoredJob:
+    """Ảnh chụp một job của SQLiteJobManager, cùng `id`/`info()` như Job."""
+
+    FIELDS = ("id", "model", "status", "total", "processed", "error", "created_at", "started_at", "finished_at")
+
+    def __init__(self, row):
+        for name, value in zip(self.FIELDS, row):
+            setattr(self, name, value)
+
+    def info(self):
+        info = {name: getattr(self, name) for name in self.FIELDS}
+        info["progress"] = self.processed / self.total if self.total else 1.0
+        return info
+
+
+class SQLiteJobManager:
+    """Như JobManager nhưng trạng thái và kết quả job nằm trong một file SQLite dùng chung,
+    nên mọi worker của serve.py đều trả lời được /jobs/<id> của nhau.
+
+    Mỗi process chạy `workers` thread nhận job đang chờ (hoặc job `running` không cập nhật quá
+    `stale_s` giây, vd. worker xử lý nó đã chết) rồi làm tiếp từ `processed`. Mỗi lần nhận ghi một
+    `owner` mới; thread heartbeat cập nhật `updated_at` của các job đang chạy trong process (kể cả
+    khi một chunk chờ lâu) và mọi lần ghi kết quả đều kiểm tra `owner`, nên worker đã mất job dừng
+    lại thay vì ghi đè. Huỷ job được ghi vào DB và thread đang xử lý kiểm tra giữa các chunk.
+    """
+
+    def __init__(self, predict_fn, db_path, workers=2, chunk_size=64, finished_ttl_s=3600,
+                 poll_s=0.5, stale_s=120):
+        self.predict_fn     = predict_fn
+        self.db_path        = db_path
+        self.workers        = max(1, int(workers))
+        self.chunk_size     = max(1, int(chunk_size))
+        self.finished_ttl_s = finished_ttl_s
+        self.poll_s         = poll_s
+        self.stale_s        = stale_s
+        self._local         = threading.local()
+        self._lock          = threading.Lock()
+        self._wake          = threading.Event()
+        self._threads       = []
+        self._pid           = None
+        self._active        = {}     # job_id -> owner của các job đang chạy trong process này
+        conn = self._db()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS job (
+            id               TEXT PRIMARY KEY,
+            model            TEXT NOT NULL,
+            status           TEXT NOT NULL,
+            total            INTEGER NOT NULL,
+            processed        INTEGER NOT NULL DEFAULT 0,
+            error            TEXT,
+            created_at       REAL NOT NULL,
+            started_at       REAL,
+            finished_at      REAL,
+            updated_at       REAL NOT NULL,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            owner            TEXT
+        )""")
+        if "owner" not in {r[1] for r in conn.execute("PRAGMA table_info(job)")}:
+            conn.execute("ALTER TABLE job ADD COLUMN owner TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_job_status ON job (status, created_at)")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_line (
+            job_id TEXT NOT NULL,
+            idx    INTEGER NOT NULL,
+            text   TEXT NOT NULL,
+            result TEXT,
+            PRIMARY KEY (job_id, idx)
+        ) WITHOUT ROWID""")
+
+    def _db(self):
+        # kết nối riêng cho mỗi thread, mở lại sau fork
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self, mode=""):
+        conn = self._db()
+        conn.execute(f"BEGIN {mode}")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _ensure_started(self):
+        # thread không sống sót qua fork nên khởi động lại theo pid
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid     = os.getpid()
+            self._wake    = threading.Event()
+            self._active  = {}
+            self._threads = [threading.Thread(target=self._loop, name=f"job-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            self._threads.append(threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True))
+            for t in self._threads:
+                t.start()
+
+    def submit(self, model, lines):
+        self._ensure_started()
+        self._prune()
+        job_id, now = uuid.uuid4().hex, time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO job (id, model, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         (job_id, model, QUEUED, len(lines), now, now))
+            conn.executemany("INSERT INTO job_line (job_id, idx, text) VALUES (?, ?, ?)",
+                             ((job_id, i, text) for i, text in enumerate(lines)))
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id):
+        self._ensure_started()
+        row = self._db().execute(f"SELECT {', '.join(StoredJob.FIELDS)} FROM job WHERE id=?", (job_id,)).fetchone()
+        return StoredJob(row) if row else None
+
+    def qsize(self):
+        return self._db().execute("SELECT COUNT(*) FROM job WHERE status=?", (QUEUED,)).fetchone()[0]
+
+    def cancel(self, job_id):
+        with self._transaction("IMMEDIATE") as conn:
+            conn.execute("UPDATE job SET cancel_requested=1 WHERE id=?", (job_id,))
+            conn.execute("UPDATE job SET status=?, finished_at=?, updated_at=? WHERE id=? AND status=?",
+                         (CANCELLED, time.time(), time.time(), job_id, QUEUED))
+        return self.get(job_id)
+
+    def iter_results(self, job, offset=0, follow=False, timeout_s=1.0):
+        """Sinh (index, text, predictions) theo thứ tự; `follow` chờ tới khi job kết thúc."""
+        i = offset
+        while True:
+            job = self.get(job.id)
+            if job is None:
+                return
+            rows = self._db().execute(
+                "SELECT idx, text, result FROM job_line WHERE job_id=? AND idx>=? AND idx<? ORDER BY idx",
+                (job.id, i, job.processed)).fetchall()
+            for idx, text, result in rows:
+                yield idx, text, json.loads(result)
+            i = max(i, job.processed)
+            if not follow or job.status in FINISHED and i >= job.processed:
+                return
+            if not rows:
+                time.sleep(min(timeout_s, self.poll_s))
+
+    def _claim(self):
+        """Nhận một job đang chờ (hoặc bị bỏ dở) cho thread này; (job_id, owner) hoặc None."""
+        now, owner = time.time(), uuid.uuid4().hex
+        with self._transaction("IMMEDIATE") as conn:
+            row = conn.execute("""
+                SELECT id FROM job WHERE status=? OR (status=? AND updated_at<?)
+                ORDER BY created_at LIMIT 1""", (QUEUED, RUNNING, now - self.stale_s)).fetchone()
+            if row is None:
+                return None
+            conn.execute("""
+                UPDATE job SET status=?, started_at=COALESCE(started_at, ?), updated_at=?, owner=?
+                WHERE id=?""", (RUNNING, now, now, owner, row[0]))
+        return row[0], owner
+
+    def _touch(self, conn, job_id, owner, processed=None):
+        """Cập nhật updated_at (và processed) nếu job vẫn thuộc `owner`; False nếu đã bị worker khác nhận."""
+        cur = conn.execute("UPDATE job SET updated_at=?, processed=COALESCE(?, processed) WHERE id=? AND owner=?",
+                           (time.time(), processed, job_id, owner))
+        return cur.rowcount == 1
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(max(0.1, self.stale_s / 4))
+            with self._lock:
+                active = list(self._active.items())
+            for job_id, owner in active:
+                try:
+                    self._touch(self._db(), job_id, owner)
+                except sqlite3.Error:
+                    pass   # thử lại ở nhịp sau
+
+    def _finish(self, job_id, owner, status, error=None):
+        now = time.time()
+        self._db().execute("UPDATE job SET status=?, error=?, finished_at=?, updated_at=? WHERE id=? AND owner=?",
+                           (status, error, now, now, job_id, owner))
+
+    def _loop(self):
+        while True:
+            try:
+                claim = self._claim()
+            except sqlite3.Error:
+                claim = None
+            if claim is None:
+                self._wake.wait(self.poll_s)
+                self._wake.clear()
+                continue
+            job_id, owner = claim
+            with self._lock:
+                self._active[job_id] = owner
+            try:
+                self._run(job_id, owner)
+            except Exception as e:
+                try:
+                    self._finish(job_id, owner, FAILED, str(e))
+                except sqlite3.Error:
+                    pass   # job còn `running`, sẽ được nhận lại sau stale_s
+            finally:
+                with self._lock:
+                    self._active.pop(job_id, None)
+
+    def _run(self, job_id, owner):
+        conn = self._db()
+        model, total, start = conn.execute("SELECT model, total, processed FROM job WHERE id=?", (job_id,)).fetchone()
+        for start in range(start, total, self.chunk_size):
+            row = conn.execute("SELECT cancel_requested FROM job WHERE id=?", (job_id,)).fetchone()
+            if row is None:
+                return
+            if row[0]:
+                break
+            chunk = [r[0] for r in conn.execute(
+                "SELECT text FROM job_line WHERE job_id=? AND idx>=? AND idx<? ORDER BY idx",
+                (job_id, start, start + self.chunk_size))]
+            if not self._touch(conn, job_id, owner):
+                return
+            preds = self.predict_fn(model, chunk)
+            with self._transaction() as conn:
+                # ghi processed trước và chỉ khi còn giữ job; mất job thì bỏ cả chunk
+                if not self._touch(conn, job_id, owner, start + len(chunk)):
+                    return
+                conn.executemany("UPDATE job_line SET result=? WHERE job_id=? AND idx=?",
+                                 ((json.dumps(p, ensure_ascii=False), job_id, start + k) for k, p in enumerate(preds)))
+        cancelled = conn.execute("SELECT cancel_requested FROM job WHERE id=?", (job_id,)).fetchone()
+        self._finish(job_id, owner, CANCELLED if cancelled and cancelled[0] else DONE)
+
+    def _prune(self):
+        # bỏ các job đã kết thúc quá lâu để DB không lớn mãi
+        with self._transaction() as conn:
+            old = [r[0] for r in conn.execute("SELECT id FROM job WHERE finished_at < ?",
+                                              (time.time() - self.finished_ttl_s,))]
+            conn.executemany("DELETE FROM job_line WHERE job_id=?", ((j,) for j in old))
+            conn.executemany("DELETE FROM job WHERE id=?", ((j,) for j in old))
@@ -0,0 +1,179 @@
+# loadtest.py
+"""Đo tải HTTP cho Flask host (flask_api_multi_model_host.py / serve.py).
+
+Hai chế độ:
+  - closed: N client đồng thời, mỗi client gửi request tiếp theo ngay khi nhận phản hồi
+  - open:   gửi request theo tốc độ cố định (req/s), không phụ thuộc phản hồi; độ trễ tính
+            từ thời điểm request lẽ ra được gửi nên hàng đợi phía client cũng được tính vào
+
+Câu được lấy lần lượt (quay vòng) từ file texts_*.txt. Mỗi mức `--concurrency` / `--rate`
+chạy `--duration` giây; throughput cao nhất giữa các mức là throughput bão hoà.
+
+Ví dụ:
+    python flask_api_multi_model_host.py --stub-models --no-debug
+    python loadtest.py --endpoint /predict_cnn --mode closed --concurrency 1 4 16 64
+    python loadtest.py --endpoint /predict_cnn_batch --batch-size 32 --mode open --rate 10 50 100
+"""
+import json
+import time
+import argparse
+import itertools
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+SINGLE_ENDPOINTS = ("/predict_pho", "/predict_cnn", "/predict_cascade")
+BATCH_ENDPOINTS  = ("/predict_pho_batch", "/predict_cnn_batch", "/predict_cascade_batch")
+
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [l.strip() for l in f if l.strip()]
+
+
+class LoadTest:
+    def __init__(self, url, endpoint, lines, batch_size=1, timeout_s=10.0):
+        self.url        = url.rstrip("/") + endpoint
+        self.batch      = endpoint in BATCH_ENDPOINTS
+        self.batch_size = batch_size if self.batch else 1
+        self.lines      = lines
+        self.timeout_s  = timeout_s
+        self._next      = itertools.count()
+        self._local     = threading.local()
+        self._lock      = threading.Lock()
+
+    def _session(self):
+        # mỗi thread một Session để giữ kết nối keep-alive
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def _payload(self):
+        with self._lock:
+            start = next(self._next) * self.batch_size
+        texts = [self.lines[(start + i) % len(self.lines)] for i in range(self.batch_size)]
+        return {"texts": texts} if self.batch else {"text": texts[0]}
+
+    def _request(self, scheduled, results):
+        payload = self._payload()
+        try:
+            resp = self._session().post(self.url, json=payload, timeout=self.timeout_s)
+            outcome = resp.status_code
+        except requests.Timeout:
+            outcome = "timeout"
+        except requests.RequestException:
+            outcome = "error"
+        results.append((time.perf_counter() - scheduled, outcome))
+
+    def closed_loop(self, concurrency, duration_s):
+        results, stop = [], time.perf_counter() + duration_s
+
+        def client():
+            while time.perf_counter() < stop:
+                self._request(time.perf_counter(), results)
+
+        threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return results, time.perf_counter() - start
+
+    def open_loop(self, rate, duration_s, max_inflight):
+        results, n = [], int(rate * duration_s)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_inflight) as pool:
+            for i in range(n):
+                scheduled = start + i / rate
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self._request, scheduled, results)
+        return results, time.perf_counter() - start
+
+
+def summarize(results, elapsed_s, texts_per_request):
+    outcomes  = Counter(o for _, o in results)
+    ok        = [lat for lat, o in results if isinstance(o, int) and 200 <= o < 300]
+    timeouts  = outcomes.get("timeout", 0)
+    errors    = len(results) - len(ok) - timeouts
+    total     = max(1, len(results))
+    latencies = np.array(ok or [float("nan")]) * 1000
+    return {
+        "requests":        len(results),
+        "ok":              len(ok),
+        "errors":          errors,
+        "timeouts":        timeouts,
+        "error_rate":      errors / total,
+        "timeout_rate":    timeouts / total,
+        "throughput_rps":  len(ok) / elapsed_s,
+        "texts_per_s":     len(ok) * texts_per_request / elapsed_s,
+        "p50_ms":          float(np.percentile(latencies, 50)),
+        "p90_ms":          float(np.percentile(latencies, 90)),
+        "p95_ms":          float(np.percentile(latencies, 95)),
+        "p99_ms":          float(np.percentile(latencies, 99)),
+        "max_ms":          float(np.max(latencies)),
+        "status_counts":   {str(k): v for k, v in sorted(outcomes.items(), key=str)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo tải HTTP cho Flask host")
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--endpoint", default="/predict_cnn",
+                        choices=[*SINGLE_ENDPOINTS, *BATCH_ENDPOINTS])
+    parser.add_argument("--texts", default="output_text_files/texts_1000.txt")
+    parser.add_argument("--batch-size", type=int, default=32, help="Số câu mỗi request (endpoint batch)")
+    parser.add_argument("--mode", default="closed", choices=["closed", "open"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16],
+                        help="Số client đồng thời (closed)")
+    parser.add_argument("--rate", nargs="+", type=float, default=[10, 50, 100],
+                        help="Số request/giây (open)")
+    parser.add_argument("--max-inflight", type=int, default=256,
+                        help="Số request đang chờ tối đa phía client (open)")
+    parser.add_argument("--duration", type=float, default=10.0, help="Số giây cho mỗi mức tải")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Số giây chạy làm nóng (không tính)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Timeout mỗi request (giây)")
+    parser.add_argument("--json", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    test = LoadTest(args.url, args.endpoint, read_lines(args.texts), args.batch_size, args.timeout)
+    if args.warmup > 0:
+        test.closed_loop(1, args.warmup)
+
+    levels = args.concurrency if args.mode == "closed" else args.rate
+    label  = "clients" if args.mode == "closed" else "rate"
+    print(f"{args.mode} loop -> {test.url} ({test.batch_size} câu/request, {args.duration:.0f}s mỗi mức)")
+    print(f"{label:>8}{'req/s':>9}{'texts/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'err %':>7}{'tmo %':>7}")
+
+    runs = []
+    for level in levels:
+        if args.mode == "closed":
+            results, elapsed = test.closed_loop(int(level), args.duration)
+        else:
+            results, elapsed = test.open_loop(level, args.duration, args.max_inflight)
+        summary = dict(summarize(results, elapsed, test.batch_size), **{label: level})
+        runs.append(summary)
+        print(f"{level:>8g}{summary['throughput_rps']:>9.1f}{summary['texts_per_s']:>10.1f}"
+              f"{summary['p50_ms']:>9.1f}{summary['p95_ms']:>9.1f}{summary['p99_ms']:>9.1f}"
+              f"{summary['error_rate'] * 100:>7.1f}{summary['timeout_rate'] * 100:>7.1f}")
+
+    best = max(runs, key=lambda r: r["throughput_rps"])
+    print(f"Throughput bão hoà: {best['throughput_rps']:.1f} req/s "
+          f"({best['texts_per_s']:.1f} câu/s) tại {label}={best[label]:g}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": test.url, "mode": args.mode, "batch_size": test.batch_size,
+                       "duration_s": args.duration, "runs": runs,
+                       "saturation_rps": best["throughput_rps"],
+                       "saturation_texts_per_s": best["texts_per_s"]}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# metrics.py
+"""Counter/Gauge/Histogram tối giản, xuất theo định dạng text của Prometheus (không cần prometheus_client).
+
+Số liệu nằm trong bộ nhớ của từng process: khi chạy serve.py nhiều worker, mỗi lần
+scrape `/metrics` chỉ thấy số liệu của worker nhận request đó.
+"""
+import time
+import threading
+import contextlib
+
+# giây: từ 0.1ms tới 10s
+LATENCY_BUCKETS    = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                      0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+_METRICS = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name       = name
+        self.help       = help
+        self.labelnames = tuple(labelnames)
+        self._values    = {}
+        self._lock      = threading.Lock()
+        _METRICS.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: cần đúng các label {self.labelnames}, nhận {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines += self._render_sample(key, value)
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value, **labels):
+        """Đặt giá trị cho counter được đếm ở nơi khác (vd. số liệu của PredictionCache)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def render():
+    """Toàn bộ metric theo định dạng text của Prometheus."""
+    lines = []
+    for metric in _METRICS:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Metric dùng chung ---
+STAGE_SECONDS = Histogram(
+    "model_stage_seconds",
+    "Time spent in each inference stage, per model",
+    ("model", "stage"))
+MODEL_BATCH_SIZE = Histogram(
+    "model_batch_size",
+    "Number of texts per forward pass",
+    ("model",), buckets=BATCH_SIZE_BUCKETS)
+MODEL_TEXTS = Counter(
+    "model_texts_total",
+    "Texts requested per model, by where the prediction came from",
+    ("model", "source"))
+CASCADE_DECISIONS = Counter(
+    "cascade_decisions_total",
+    "Sentences decided by each model in cascade mode (cache misses only)",
+    ("model",))
+MICROBATCH_SIZE = Histogram(
+    "microbatch_size",
+    "Number of requests coalesced into one micro-batch",
+    ("batcher",), buckets=BATCH_SIZE_BUCKETS)
+MICROBATCH_WAIT_SECONDS = Histogram(
+    "microbatch_queue_wait_seconds",
+    "Time a request waits in the micro-batch queue before its batch starts",
+    ("batcher",))
+QUEUE_DEPTH = Gauge(
+    "queue_depth",
+    "Items waiting in each queue at scrape time",
+    ("queue",))
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Batch requests rejected because a model's bulk queue was full",
+    ("queue",))
+MICROBATCH_EXPIRED = Counter(
+    "microbatch_expired_total",
+    "Requests dropped from a micro-batch queue because their deadline had passed",
+    ("batcher",))
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests by endpoint and status code",
+    ("endpoint", "status"))
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "End-to-end HTTP request latency by endpoint",
+    ("endpoint",))
+CACHE_LOOKUPS = Counter(
+    "prediction_cache_lookups_total",
+    "Prediction cache lookups by result",
+    ("result",))
+CACHE_ENTRIES = Gauge(
+    "prediction_cache_entries",
+    "Entries in the in-memory prediction cache")
+CACHE_HIT_RATIO = Gauge(
+    "prediction_cache_hit_ratio",
+    "Prediction cache hit ratio since start")
+MODEL_LOADED = Gauge(
+    "model_loaded",
+    "1 if the model is loaded in this process",
+    ("model",))
+PROCESS_RSS_BYTES = Gauge(
+    "process_resident_memory_bytes",
+    "Resident memory of this process")
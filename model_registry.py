@@ -0,0 +1,221 @@
+# model_registry.py
+import os
+import gc
+import json
+import hashlib
+import time
+import threading
+import warnings
+
+import onnx_backend
+from inference_models import RUNTIMES
+
+MODEL_CONFIG = os.environ.get("MODEL_CONFIG", "models.json")
+
+
+def load_config(path=MODEL_CONFIG):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def process_rss_bytes():
+    """RSS hiện tại của process (Linux), None nếu không đọc được."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def artifact_files(spec):
+    """Các file artifact được nhắc tới trong spec (file hoặc thư mục)."""
+    files = []
+    for value in spec.values():
+        if not isinstance(value, str):
+            continue
+        if os.path.isfile(value):
+            files.append(value)
+        elif os.path.isdir(value):
+            files += sorted(os.path.join(value, f) for f in os.listdir(value)
+                            if os.path.isfile(os.path.join(value, f)))
+    return files
+
+
+# các khoá chỉ ảnh hưởng vận hành, không ảnh hưởng kết quả dự đoán
+RUNTIME_ONLY_KEYS = {"eager", "warmup_batches", "idle_ttl_s", "torchscript"}
+
+
+def model_version(spec, engine, precision):
+    """Hash rẻ (không cần nạp model) của spec + kích thước/mtime artifact + engine/precision.
+
+    Với engine onnx: gồm cả file ONNX đang được dùng; nếu file đó không dùng được (chưa verified
+    hoặc export từ checkpoint khác) thì host chạy PyTorch nên version tính như engine torch.
+    """
+    onnx_files = []
+    if engine == "onnx":
+        entry = onnx_backend.verified_entry(spec["type"], source_version(spec), warn=False)
+        if entry is None:
+            engine = "torch"
+        else:
+            onnx_files = onnx_backend.model_files(entry)
+    spec = {k: v for k, v in spec.items() if k not in RUNTIME_ONLY_KEYS}
+    h = hashlib.sha1(json.dumps(spec, sort_keys=True).encode("utf-8"))
+    h.update(f"{engine}|{precision}".encode("utf-8"))
+    for path in artifact_files(spec) + onnx_files:
+        st = os.stat(path)
+        h.update(f"{os.path.basename(path)}|{st.st_size}|{int(st.st_mtime)}".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def source_version(spec):
+    """Version của checkpoint PyTorch fp32 mà onnx_export.py dùng để export/kiểm tra;
+    được ghi vào manifest ONNX và so khớp khi host nạp session."""
+    return model_version(spec, "torch", "fp32")
+
+
+class ModelEntry:
+    def __init__(self, name, spec):
+        self.name        = name
+        self.spec        = spec
+        self.lock        = threading.Lock()
+        self.runtime     = None
+        self.load_time_s = None
+        self.loaded_at   = None
+        self.last_used   = None
+        self.load_count  = 0
+        self.error       = None
+
+
+class ModelRegistry:
+    """Nạp model khi dùng lần đầu (hoặc ngay khi khởi động nếu `eager`),
+    warmup sau khi nạp và giải phóng model không được dùng quá `idle_ttl_s` giây."""
+
+    def __init__(self, config, device, engine="torch", precision="fp32", ort_threads=0,
+                 batch_size=32):
+        self.device      = device
+        self.engine      = engine
+        self.precision   = precision
+        self.ort_threads = ort_threads
+        self.batch_size  = batch_size
+        self._sweeper     = None
+        self._sweeper_pid = None
+        self.reconfigure(config)
+
+    def reconfigure(self, config):
+        """Thay toàn bộ danh sách model; các model đang nạp sẽ được nạp lại khi dùng."""
+        self.config   = config
+        self.entries  = {name: ModelEntry(name, spec) for name, spec in config["models"].items()}
+        self.versions = {name: model_version(spec, self.engine, self.precision)
+                         for name, spec in config["models"].items()}
+        gc.collect()
+
+    def names(self):
+        return list(self.entries)
+
+    def version(self, name):
+        return self.versions[name]
+
+    def spec(self, name):
+        return self.entries[name].spec
+
+    def get(self, name):
+        """Trả về runtime đã nạp của model `name`, nạp nếu cần."""
+        entry = self.entries[name]
+        runtime = entry.runtime
+        if runtime is None:
+            with entry.lock:
+                if entry.runtime is None:
+                    self._load(entry)
+                runtime = entry.runtime
+        entry.last_used = time.time()
+        return runtime
+
+    def _load(self, entry):
+        spec  = entry.spec
+        start = time.perf_counter()
+        try:
+            runtime = RUNTIMES[spec["type"]](entry.name, spec, self.device, self.engine,
+                                             self.precision, self.ort_threads,
+                                             source_version=source_version(spec)).load()
+            runtime.warmup(self.batch_size, spec.get("warmup_batches", 1))
+        except Exception as e:
+            entry.error = str(e)
+            raise
+        entry.runtime     = runtime
+        entry.error       = None
+        entry.load_time_s = time.perf_counter() - start
+        entry.loaded_at   = time.time()
+        entry.load_count += 1
+
+    def unload(self, name):
+        entry = self.entries[name]
+        with entry.lock:
+            if entry.runtime is None:
+                return False
+            entry.runtime = None
+        gc.collect()
+        return True
+
+    def load_eager(self):
+        for name, entry in self.entries.items():
+            if entry.spec.get("eager"):
+                self.get(name)
+
+    def evict_idle(self, now=None):
+        now = now or time.time()
+        evicted = []
+        for name, entry in self.entries.items():
+            ttl = entry.spec.get("idle_ttl_s", 0)
+            if ttl and entry.runtime is not None and entry.last_used and now - entry.last_used > ttl:
+                if self.unload(name):
+                    evicted.append(name)
+        return evicted
+
+    def start_sweeper(self, interval_s=None):
+        """Thread nền định kỳ giải phóng model nhàn rỗi (chỉ khi có model đặt idle_ttl_s)."""
+        ttls = [e.spec.get("idle_ttl_s", 0) for e in self.entries.values()]
+        ttls = [t for t in ttls if t]
+        # thread không sống sót qua fork nên mỗi process tự khởi động sweeper của mình
+        if not ttls or (self._sweeper is not None and self._sweeper_pid == os.getpid()):
+            return
+        interval_s = interval_s or max(1.0, min(ttls) / 4)
+
+        def loop():
+            while True:
+                time.sleep(interval_s)
+                try:
+                    self.evict_idle()
+                except Exception as e:
+                    warnings.warn(f"Lỗi khi giải phóng model nhàn rỗi: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="model-sweeper", daemon=True)
+        self._sweeper_pid = os.getpid()
+        self._sweeper.start()
+
+    def status(self):
+        now = time.time()
+        models = []
+        for name, entry in self.entries.items():
+            runtime = entry.runtime
+            models.append({
+                "name":         name,
+                "type":         entry.spec["type"],
+                "loaded":       runtime is not None,
+                "eager":        bool(entry.spec.get("eager")),
+                "engine":       self.engine if runtime is None or runtime.session is not None
+                                else "torch",
+                "precision":    self.precision,
+                "max_length":   entry.spec["max_length"],
+                "threshold":    entry.spec["threshold"],
+                "version":      self.versions[name],
+                "idle_ttl_s":   entry.spec.get("idle_ttl_s", 0),
+                "load_time_s":  entry.load_time_s,
+                "load_count":   entry.load_count,
+                "loaded_at":    entry.loaded_at,
+                "idle_s":       now - entry.last_used if entry.last_used else None,
+                "memory_mb":    runtime.memory_bytes() / 2**20 if runtime is not None else 0,
+                "error":        entry.error,
+            })
+        rss = process_rss_bytes()
+        return {"models": models, "process_rss_mb": rss / 2**20 if rss else None}
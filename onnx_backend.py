@@ -0,0 +1,72 @@
+# onnx_backend.py
+import os
+import json
+import warnings
+
+import numpy as np
+
+ONNX_DIR      = os.environ.get("ONNX_DIR", "onnx_models")
+MANIFEST_FILE = "manifest.json"
+ONNX_FILES    = {"phobert": "phobert.onnx", "cnn": "cnn_lstm_attention.onnx"}
+
+
+def read_manifest(onnx_dir=ONNX_DIR):
+    path = os.path.join(onnx_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, onnx_dir=ONNX_DIR):
+    with open(os.path.join(onnx_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def create_session(path, num_threads=0):
+    """Tạo InferenceSession cho CPU với mọi tối ưu đồ thị được bật."""
+    import onnxruntime as ort
+    opts = ort.SessionOptions()
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        opts.intra_op_num_threads = num_threads
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def model_files(entry, onnx_dir=ONNX_DIR):
+    """File .onnx của một mục manifest cùng file trọng số ngoài (.onnx.data) nếu có."""
+    path = os.path.join(onnx_dir, entry["file"])
+    return [p for p in (path, path + ".data") if os.path.exists(p)]
+
+
+def verified_entry(name, source_version, onnx_dir=ONNX_DIR, warn=True):
+    """Mục manifest của `name` nếu đã verified và được export từ đúng bản model `source_version`
+    (xem model_registry.source_version), ngược lại None."""
+    entry = read_manifest(onnx_dir).get(name)
+    if not entry or not entry.get("verified") or not os.path.exists(os.path.join(onnx_dir, entry["file"])):
+        reason = f"chưa được export/kiểm tra trong {onnx_dir}"
+    elif entry.get("source_version") != source_version:
+        reason = "được export từ bản checkpoint khác; chạy lại onnx_export.py"
+    else:
+        return entry
+    if warn:
+        warnings.warn(f"ONNX model '{name}' {reason}, dùng PyTorch.")
+    return None
+
+
+def load_session(name, source_version, onnx_dir=ONNX_DIR, num_threads=0):
+    """Trả về (session, số byte của file ONNX) nếu model đã được export và kiểm tra từ đúng
+    checkpoint hiện tại, ngược lại (None, 0) (khi đó host dùng PyTorch eager)."""
+    entry = verified_entry(name, source_version, onnx_dir)
+    if entry is None:
+        return None, 0
+    path = os.path.join(onnx_dir, entry["file"])
+    try:
+        return create_session(path, num_threads), sum(os.path.getsize(p) for p in model_files(entry, onnx_dir))
+    except Exception as e:
+        warnings.warn(f"Không tải được ONNX model '{name}': {e}. Dùng PyTorch.")
+        return None, 0
+
+
+def sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
@@ -0,0 +1,161 @@
+# onnx_export.py
+"""Export PhoBERT và CNN–BiLSTM–Attention sang ONNX rồi kiểm tra với PyTorch.
+
+Ví dụ:
+    python onnx_export.py --texts output_text_files/texts_1000.txt
+    INFERENCE_ENGINE=onnx python flask_api_multi_model_host.py
+
+Chỉ model có sai khác nằm trong ngưỡng mới được đánh dấu `verified` trong
+manifest; host chỉ nạp các model đã verified.
+"""
+import os
+import argparse
+
+# export luôn dùng PyTorch fp32 làm chuẩn so sánh
+os.environ["INFERENCE_ENGINE"] = "torch"
+os.environ["MODEL_PRECISION"]  = "fp32"
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+import flask_api_multi_model_host as host
+import onnx_backend
+from model_registry import source_version
+from batching import length_buckets
+from inference_models import CNNInferenceModel
+
+
+class PhoBertLogits(nn.Module):
+    """Bọc model HF để đồ thị ONNX chỉ có một output `logits`."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+SAMPLE_TEXTS = ["giảng viên nhiệt tình", "tài liệu học tập đầy đủ và rõ ràng"]
+
+
+def export_phobert(runtime, path, opset):
+    model  = PhoBertLogits(runtime.model).eval()
+    sample = runtime.collate(runtime.encode(SAMPLE_TEXTS), "longest")
+    torch.onnx.export(
+        model, (sample["input_ids"], sample["attention_mask"]), path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids":      {0: "batch", 1: "sequence"},
+                      "attention_mask": {0: "batch", 1: "sequence"},
+                      "logits":         {0: "batch"}},
+        opset_version=opset,
+    )
+
+
+def optimize_phobert(runtime, path):
+    """Gộp các node attention/LayerNorm bằng optimizer transformer của onnxruntime."""
+    try:
+        from onnxruntime.transformers import optimizer
+    except ImportError:
+        print("  (bỏ qua tối ưu: không có onnxruntime.transformers)")
+        return
+    config = runtime.model.config
+    opt = optimizer.optimize_model(path, model_type="bert",
+                                   num_heads=config.num_attention_heads,
+                                   hidden_size=config.hidden_size)
+    opt.save_model_to_file(path)
+
+
+def export_cnn(runtime, path, opset):
+    model  = CNNInferenceModel(runtime.model).eval()
+    sample = runtime.collate(runtime.encode(SAMPLE_TEXTS), "longest")
+    torch.onnx.export(
+        model, (sample,), path,
+        input_names=["input_ids"],
+        output_names=["logits"],
+        dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                      "logits":    {0: "batch"}},
+        opset_version=opset,
+    )
+
+
+def compare(runtime, session, texts, batch_size):
+    """So sánh xác suất ONNX với PyTorch trên cùng các batch đã pad."""
+    encoded   = runtime.encode(texts)
+    threshold = runtime.threshold
+
+    max_diff, mismatched = 0.0, 0
+    for bucket in length_buckets([len(x) for x in encoded], batch_size):
+        batch = runtime.collate([encoded[i] for i in bucket], "longest")
+        if runtime.kind == "phobert":
+            feeds = {"input_ids": batch["input_ids"].numpy(),
+                     "attention_mask": batch["attention_mask"].numpy()}
+        else:
+            feeds = {"input_ids": batch.numpy()}
+        ref = runtime.run(batch)
+        got = onnx_backend.sigmoid(session.run(["logits"], feeds)[0])
+        max_diff   = max(max_diff, float(np.abs(got - ref).max()))
+        mismatched += int(((got > threshold) != (ref > threshold)).any(axis=1).sum())
+    return max_diff, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export model sang ONNX và kiểm tra với PyTorch")
+    parser.add_argument("--models", nargs="+", choices=list(onnx_backend.ONNX_FILES),
+                        default=list(onnx_backend.ONNX_FILES))
+    parser.add_argument("--out-dir", default=onnx_backend.ONNX_DIR)
+    parser.add_argument("--texts", default="output_text_files/texts_1000.txt")
+    parser.add_argument("--opset", type=int, default=18)
+    parser.add_argument("--atol", type=float, default=1e-3,
+                        help="Sai khác xác suất tối đa cho phép")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--no-optimize", action="store_true",
+                        help="Không chạy optimizer transformer cho PhoBERT")
+    args = parser.parse_args()
+
+    # so sánh trên CPU để cùng điều kiện với CPUExecutionProvider
+    host.registry.device = torch.device("cpu")
+
+    with open(args.texts, "r", encoding="utf-8") as f:
+        texts = [l.strip() for l in f if l.strip()]
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    manifest = onnx_backend.read_manifest(args.out_dir)
+    failed   = False
+    for name in args.models:
+        path = os.path.join(args.out_dir, onnx_backend.ONNX_FILES[name])
+        print(f"[{name}] export -> {path}")
+        runtime = host.registry.get(name)
+        if name == "phobert":
+            export_phobert(runtime, path, args.opset)
+            if not args.no_optimize:
+                optimize_phobert(runtime, path)
+        else:
+            export_cnn(runtime, path, args.opset)
+
+        session = onnx_backend.create_session(path)
+        max_diff, mismatched = compare(runtime, session, texts, args.batch_size)
+        verified = max_diff <= args.atol
+        failed   = failed or not verified
+        print(f"[{name}] {len(texts)} câu: max |Δprob| = {max_diff:.2e}, "
+              f"câu lệch nhãn = {mismatched} -> {'OK' if verified else 'FAIL'}")
+        manifest[name] = {
+            "file":          onnx_backend.ONNX_FILES[name],
+            "opset":         args.opset,
+            "texts":         args.texts,
+            "max_abs_diff":  max_diff,
+            "mismatched":    mismatched,
+            "atol":          args.atol,
+            "verified":      verified,
+            # host chỉ dùng file này khi checkpoint hiện tại vẫn là bản đã export
+            "source_version": source_version(runtime.spec),
+        }
+
+    onnx_backend.write_manifest(manifest, args.out_dir)
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# precision_report.py
+"""So sánh độ chính xác / độ trễ / bộ nhớ giữa các chế độ precision (fp32, int8, bf16).
+
+Mỗi precision chạy trong một process riêng (MODEL_PRECISION=<p>) để đo RSS độc lập.
+Vì `data_20k.xlsx` chỉ có nhãn cảm xúc cấp câu (0/1/2), báo cáo gồm:
+  - macro-F1 theo từng nhãn aspect###sentiment của `label_map.json`, lấy dự đoán fp32 làm chuẩn
+  - macro-F1 cảm xúc cấp câu so với nhãn gốc (cảm xúc của nhãn có xác suất cao nhất)
+
+Ví dụ:
+    python precision_report.py --limit 5000 --json precision_report.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import tempfile
+
+import numpy as np
+
+from batching import length_buckets
+
+LABEL_MAP_FILE = "label_map.json"
+SENTIMENTS     = ["negative", "neutral", "positive"]  # trùng id trong bảng Sentiment
+
+
+def load_texts(path, limit=None):
+    import pandas as pd
+    df = pd.read_excel(path)
+    df = df.dropna(subset=["text"])
+    if limit:
+        df = df.iloc[:limit]
+    return df["text"].astype(str).str.strip().tolist(), df["label"].astype(int).to_numpy()
+
+
+def label_names():
+    with open(LABEL_MAP_FILE, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return [k for k, _ in sorted(raw.items(), key=lambda kv: kv[1])]
+
+
+def f1_per_label(pred, ref):
+    """F1 cho từng cột của hai ma trận nhị phân (n_samples, n_labels)."""
+    tp = (pred & ref).sum(0)
+    fp = (pred & ~ref).sum(0)
+    fn = (~pred & ref).sum(0)
+    denom = 2 * tp + fp + fn
+    # nhãn không xuất hiện ở cả hai phía được tính là khớp hoàn toàn
+    return np.where(denom == 0, 1.0, 2 * tp / np.maximum(denom, 1))
+
+
+def macro_f1_multiclass(pred, gold, n_classes):
+    pred_oh = np.eye(n_classes, dtype=bool)[pred]
+    gold_oh = np.eye(n_classes, dtype=bool)[gold]
+    return float(f1_per_label(pred_oh, gold_oh).mean())
+
+
+def sentence_sentiment(probs, idx2label):
+    """Cảm xúc cấp câu = cảm xúc của nhãn có xác suất cao nhất."""
+    best = probs.argmax(1)
+    return np.array([SENTIMENTS.index(idx2label[i][1].lower()) for i in best])
+
+
+def peak_rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+# ---------------- Worker: chạy trong process con ----------------
+
+def run_worker(args):
+    t0 = time.perf_counter()
+    import flask_api_multi_model_host as host
+    load_s = time.perf_counter() - t0
+
+    texts, _ = load_texts(args.data, args.limit)
+    result = {"precision": args.precision, "load_s": load_s, "models": {}}
+    for name in args.models:
+        t0 = time.perf_counter()
+        runtime = host.registry.get(name)
+        result["load_s"] += time.perf_counter() - t0
+        idx2label = runtime.idx2label
+        encoded = runtime.encode(texts)
+        probs, latencies = np.zeros((len(texts), len(idx2label)), dtype=np.float32), []
+        start = time.perf_counter()
+        for bucket in length_buckets([len(x) for x in encoded], args.batch_size):
+            t = time.perf_counter()
+            probs[bucket] = runtime.run(runtime.collate([encoded[i] for i in bucket], "longest"))
+            latencies.append((time.perf_counter() - t) * 1000)
+        total = time.perf_counter() - start
+        np.save(os.path.join(args.out_dir, f"{name}_{args.precision}.npy"), probs)
+        result["models"][name] = {
+            "sentences_per_s":  len(texts) / total,
+            "batch_p50_ms":     float(np.percentile(latencies, 50)),
+            "batch_p95_ms":     float(np.percentile(latencies, 95)),
+            "threshold":        runtime.threshold,
+            "idx2label":        {int(k): list(v) for k, v in idx2label.items()},
+        }
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(os.path.join(args.out_dir, f"result_{args.precision}.json"), "w", encoding="utf-8") as f:
+        json.dump(result, f)
+
+
+# ---------------- Điều phối + báo cáo ----------------
+
+def run_precision(precision, args, out_dir):
+    env = dict(os.environ, MODEL_PRECISION=precision, INFERENCE_ENGINE="torch")
+    cmd = [sys.executable, os.path.abspath(__file__), "--worker", "--precision", precision,
+           "--out-dir", out_dir, "--data", args.data, "--batch-size", str(args.batch_size),
+           "--models", *args.models]
+    if args.limit:
+        cmd += ["--limit", str(args.limit)]
+    subprocess.run(cmd, env=env, check=True)
+    with open(os.path.join(out_dir, f"result_{precision}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_report(results, out_dir, gold, names):
+    report = {}
+    for precision, res in results.items():
+        entry = {"peak_rss_mb": res["peak_rss_mb"], "load_s": res["load_s"], "models": {}}
+        for name, m in res["models"].items():
+            idx2label = {int(k): tuple(v) for k, v in m["idx2label"].items()}
+            # sắp cột theo thứ tự của label_map.json để hai model so sánh cùng nhãn
+            order = [next(i for i, (a, s) in idx2label.items() if f"{a}###{s}".lower() == n.lower())
+                     for n in names]
+            probs = np.load(os.path.join(out_dir, f"{name}_{precision}.npy"))[:, order]
+            ref   = np.load(os.path.join(out_dir, f"{name}_fp32.npy"))[:, order]
+            thr   = m["threshold"]
+            per_label = f1_per_label(probs > thr, ref > thr)
+            sent = sentence_sentiment(probs, {j: idx2label[i] for j, i in enumerate(order)})
+            entry["models"][name] = {
+                "sentences_per_s":         m["sentences_per_s"],
+                "batch_p50_ms":            m["batch_p50_ms"],
+                "batch_p95_ms":            m["batch_p95_ms"],
+                "macro_f1_vs_fp32":        float(per_label.mean()),
+                "f1_vs_fp32_per_label":    dict(zip(names, map(float, per_label))),
+                "sentence_macro_f1_gold":  macro_f1_multiclass(sent, gold, len(SENTIMENTS)),
+            }
+        report[precision] = entry
+    return report
+
+
+def print_report(report):
+    print(f"{'precision':<10}{'model':<9}{'sent/s':>9}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'F1 vs fp32':>12}{'F1 gold':>9}{'RSS MB':>9}")
+    for precision, entry in report.items():
+        for name, m in entry["models"].items():
+            print(f"{precision:<10}{name:<9}{m['sentences_per_s']:>9.1f}{m['batch_p50_ms']:>9.1f}"
+                  f"{m['batch_p95_ms']:>9.1f}{m['macro_f1_vs_fp32']:>12.4f}"
+                  f"{m['sentence_macro_f1_gold']:>9.4f}{entry['peak_rss_mb']:>9.0f}")
+    for precision, entry in report.items():
+        if precision == "fp32":
+            continue
+        for name, m in entry["models"].items():
+            worst = sorted(m["f1_vs_fp32_per_label"].items(), key=lambda kv: kv[1])[:3]
+            print(f"{precision}/{name} nhãn lệch nhiều nhất: "
+                  + ", ".join(f"{k}={v:.3f}" for k, v in worst))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo độ chính xác/độ trễ/RSS theo precision")
+    parser.add_argument("--data", default="data_20k.xlsx")
+    parser.add_argument("--limit", type=int, default=None, help="Chỉ dùng N câu đầu")
+    parser.add_argument("--precisions", nargs="+", default=None,
+                        help="Mặc định: fp32 int8 (+ bf16 nếu CPU hỗ trợ)")
+    parser.add_argument("--models", nargs="+", default=["phobert", "cnn"], choices=["phobert", "cnn"])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--json", default=None, help="Ghi báo cáo ra file JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--precision", default="fp32", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from quantization import cpu_supports_bf16
+    precisions = args.precisions or (["fp32", "int8"] + (["bf16"] if cpu_supports_bf16() else []))
+    if "fp32" not in precisions:
+        precisions = ["fp32"] + precisions  # cần fp32 làm chuẩn
+
+    _, gold = load_texts(args.data, args.limit)
+    with tempfile.TemporaryDirectory() as out_dir:
+        results = {p: run_precision(p, args, out_dir) for p in precisions}
+        report  = build_report(results, out_dir, gold, label_names())
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
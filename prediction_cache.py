@@ -0,0 +1,141 @@
+# prediction_cache.py
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_text(text, lowercase=False):
+    """Chuẩn hoá câu trước khi tra cache/dự đoán: Unicode NFC, gộp khoảng trắng, lowercase nếu model cần."""
+    text = _WS.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    return text.lower() if lowercase else text
+
+
+def cache_key(model, version, text):
+    return hashlib.sha1(f"{model}\x00{version}\x00{text}".encode("utf-8")).hexdigest()
+
+
+class PredictionCache:
+    """Cache kết quả dự đoán: LRU có TTL trong bộ nhớ, thêm tầng SQLite (tuỳ chọn)
+    để giữ qua các lần khởi động lại và dùng chung giữa các worker."""
+
+    def __init__(self, max_entries=100_000, ttl_s=0, sqlite_path=None):
+        self.max_entries = max_entries
+        self.ttl_s       = ttl_s
+        self.sqlite_path = sqlite_path
+        self._mem        = OrderedDict()
+        self._lock       = threading.Lock()
+        self._local      = threading.local()
+        self.counters    = {"hits_memory": 0, "hits_sqlite": 0, "misses": 0, "puts": 0, "evictions": 0}
+        if sqlite_path:
+            self._db().execute("""
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                key        TEXT PRIMARY KEY,
+                value      TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            """)
+
+    # --- SQLite: mỗi thread (và mỗi process sau fork) một connection ---
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.sqlite_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid  = os.getpid()
+        return conn
+
+    def _expired(self, created_at, now):
+        return self.ttl_s and now - created_at > self.ttl_s
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def get_many(self, keys, count_misses=True):
+        """Trả về dict key -> giá trị cho các key có trong cache.
+
+        count_misses=False cho lượt tra trước mà khi trượt sẽ được tra lại (và đếm) ở bước sau,
+        để mỗi câu chỉ được tính là một lần trượt."""
+        now, found = time.time(), {}
+        with self._lock:
+            for key in keys:
+                item = self._mem.get(key)
+                if item is None:
+                    continue
+                if self._expired(item[1], now):
+                    del self._mem[key]
+                    continue
+                self._mem.move_to_end(key)
+                found[key] = item[0]
+        self._count("hits_memory", len(found))
+
+        missing = [k for k in dict.fromkeys(keys) if k not in found]
+        if self.sqlite_path and missing:
+            from_db = {}
+            for i in range(0, len(missing), 500):
+                chunk = missing[i:i + 500]
+                rows = self._db().execute(
+                    f"SELECT key, value, created_at FROM prediction_cache "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                for key, value, created_at in rows:
+                    if not self._expired(created_at, now):
+                        from_db[key] = json.loads(value)
+            self._count("hits_sqlite", len(from_db))
+            self._put_memory({k: (v, now) for k, v in from_db.items()})
+            found.update(from_db)
+        if count_misses:
+            self._count("misses", len(set(keys)) - len(found))
+        return found
+
+    def put_many(self, items):
+        """Lưu dict key -> giá trị."""
+        if not items:
+            return
+        now = time.time()
+        self._put_memory({k: (v, now) for k, v in items.items()})
+        self._count("puts", len(items))
+        if self.sqlite_path:
+            conn = self._db()
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO prediction_cache (key, value, created_at) VALUES (?, ?, ?)",
+                    [(k, json.dumps(v, ensure_ascii=False), now) for k, v in items.items()])
+                conn.execute("COMMIT")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _put_memory(self, items):
+        evicted = 0
+        with self._lock:
+            for key, item in items.items():
+                self._mem[key] = item
+                self._mem.move_to_end(key)
+            while len(self._mem) > self.max_entries:
+                self._mem.popitem(last=False)
+                evicted += 1
+        self._count("evictions", evicted)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self.sqlite_path:
+            self._db().execute("DELETE FROM prediction_cache")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters, entries=len(self._mem), max_entries=self.max_entries)
+        lookups = stats["hits_memory"] + stats["hits_sqlite"] + stats["misses"]
+        stats["hit_rate"] = (stats["hits_memory"] + stats["hits_sqlite"]) / lookups if lookups else 0.0
+        return stats
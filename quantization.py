@@ -0,0 +1,39 @@
+# quantization.py
+import contextlib
+
+import torch
+import torch.nn as nn
+
+PRECISIONS = ("fp32", "int8", "bf16")
+
+
+def cpu_supports_bf16():
+    """CPU có lệnh bf16 gốc (AVX512-BF16 / AMX) hay không; nếu không autocast bf16 sẽ chậm hơn fp32."""
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def quantize_dynamic_int8(model):
+    """Lượng tử hoá động int8 cho các lớp Linear/LSTM (trọng số int8, activation fp32)."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear, nn.LSTM}, dtype=torch.qint8)
+
+
+def apply_precision(model, precision, device):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Precision không hợp lệ: {precision} (chọn một trong {PRECISIONS})")
+    if precision == "int8":
+        if device.type != "cpu":
+            raise ValueError("Lượng tử hoá động int8 chỉ hỗ trợ CPU")
+        return quantize_dynamic_int8(model)
+    return model
+
+
+def precision_context(precision, device):
+    """Context cho forward: autocast bf16 khi precision là bf16, ngược lại không làm gì."""
+    if precision == "bf16":
+        return torch.autocast(device_type=device.type, dtype=torch.bfloat16)
+    return contextlib.nullcontext()
@@ -0,0 +1,119 @@
+# rollup.py
+"""Bảng tổng hợp SentenceRollup: số câu theo (aspect, sentiment, semester, course, class).
+
+Trigger trên Sentence giữ bảng luôn khớp khi INSERT/DELETE/UPDATE, nên trang thống kê chỉ
+đọc vài nghìn dòng tổng hợp thay vì cả bảng Sentence. Chiều NULL được giữ là NULL; unique
+index dùng IFNULL(..., -1) để các dòng có chiều NULL vẫn gộp được.
+
+Ví dụ:
+    python rollup.py rebuild --db aspect_sa.db   # tính lại từ Sentence (dữ liệu cũ hoặc sau khi sửa tay)
+    python rollup.py verify  --db aspect_sa.db   # so sánh với COUNT(*) trên Sentence
+"""
+import sys
+import time
+import sqlite3
+import argparse
+
+ROLLUP_DIMS = ("aspect_id", "sentiment_id", "semester_id", "course_id", "class_id")
+
+_KEY = ", ".join(f"IFNULL({c}, -1)" for c in ROLLUP_DIMS)
+
+
+def _match(prefix):
+    # so khớp theo đúng biểu thức của unique index để dùng được index
+    return " AND ".join(f"IFNULL({c}, -1) = IFNULL({prefix}.{c}, -1)" for c in ROLLUP_DIMS)
+
+
+def _add(prefix):
+    return f"""
+    INSERT INTO SentenceRollup ({', '.join(ROLLUP_DIMS)}, n)
+    VALUES ({', '.join(f'{prefix}.{c}' for c in ROLLUP_DIMS)}, 1)
+    ON CONFLICT ({_KEY}) DO UPDATE SET n = n + 1;"""
+
+
+def _remove(prefix):
+    return f"""
+    UPDATE SentenceRollup SET n = n - 1 WHERE {_match(prefix)};
+    DELETE FROM SentenceRollup WHERE {_match(prefix)} AND n <= 0;"""
+
+
+ROLLUP_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS SentenceRollup (
+        {' '.join(f'{c} INTEGER,' for c in ROLLUP_DIMS)}
+        n INTEGER NOT NULL
+    );""",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS idx_sentence_rollup_key ON SentenceRollup ({_KEY})",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sentence_rollup_insert AFTER INSERT ON Sentence
+    BEGIN {_add('NEW')}
+    END;""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sentence_rollup_delete AFTER DELETE ON Sentence
+    BEGIN {_remove('OLD')}
+    END;""",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_sentence_rollup_update
+    AFTER UPDATE OF {', '.join(ROLLUP_DIMS)} ON Sentence
+    BEGIN {_remove('OLD')}{_add('NEW')}
+    END;""",
+]
+
+
+def _fill_rollup(conn):
+    cols = ", ".join(ROLLUP_DIMS)
+    conn.execute("DELETE FROM SentenceRollup")
+    conn.execute(f"INSERT INTO SentenceRollup ({cols}, n) SELECT {cols}, COUNT(*) FROM Sentence GROUP BY {cols}")
+
+
+def rebuild_rollup(conn):
+    """Tính lại toàn bộ SentenceRollup từ Sentence trong một transaction; trả về số dòng tổng hợp."""
+    with conn:
+        _fill_rollup(conn)
+    return conn.execute("SELECT COUNT(*) FROM SentenceRollup").fetchone()[0]
+
+
+def create_rollup(conn):
+    """Migration: tạo bảng, index, trigger rồi điền từ dữ liệu hiện có (không commit,
+    create_database commit cả migration)."""
+    for sql in ROLLUP_DDL:
+        conn.execute(sql)
+    _fill_rollup(conn)
+
+
+def rollup_mismatches(conn):
+    """Các nhóm mà số đếm trong SentenceRollup khác COUNT(*) trên Sentence."""
+    cols = ", ".join(ROLLUP_DIMS)
+    actual   = {r[:-1]: r[-1] for r in conn.execute(f"SELECT {cols}, COUNT(*) FROM Sentence GROUP BY {cols}")}
+    expected = {r[:-1]: r[-1] for r in conn.execute(f"SELECT {cols}, n FROM SentenceRollup")}
+    return {k: (expected.get(k, 0), actual.get(k, 0)) for k in actual.keys() | expected.keys()
+            if expected.get(k, 0) != actual.get(k, 0)}
+
+
+def main():
+    from utils import DB_NAME, create_database
+
+    parser = argparse.ArgumentParser(description="Quản lý bảng tổng hợp SentenceRollup")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--db", default=DB_NAME)
+    args = parser.parse_args()
+
+    create_database(args.db)
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "rebuild":
+            start = time.perf_counter()
+            n = rebuild_rollup(conn)
+            print(f"Đã tính lại SentenceRollup: {n} nhóm trong {time.perf_counter() - start:.2f}s")
+        else:
+            bad = rollup_mismatches(conn)
+            for key, (rollup_n, sentence_n) in sorted(bad.items(), key=str)[:20]:
+                print(f"{key}: rollup {rollup_n}, Sentence {sentence_n}")
+            print(f"{len(bad)} nhóm lệch" if bad else "SentenceRollup khớp với Sentence")
+            sys.exit(1 if bad else 0)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
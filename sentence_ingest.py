@@ -0,0 +1,110 @@
+# sentence_ingest.py
+"""Ghi hàng loạt kết quả phân tích vào bảng Sentence.
+
+Các bảng danh mục (Aspect, Sentiment, Semester, Course, AcademicYear, Class, Student) được
+nạp vào bộ nhớ một lần; tên được tra theo lowercase + trim, rồi các dòng được ghi bằng
+executemany, mỗi chunk một transaction.
+"""
+import os
+import uuid
+import time
+
+INGEST_CHUNK_SIZE = int(os.environ.get("INGEST_CHUNK_SIZE", 5000))
+
+INSERT_SENTENCE_SQL = """
+INSERT INTO Sentence
+  (id, text, aspect_id, sentiment_id, semester_id, course_id, academic_year_id, class_id, student_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# khoá -> (bảng, cột tên)
+DIMENSIONS = {
+    "aspect":        ("Aspect",       "name"),
+    "sentiment":     ("Sentiment",    "name"),
+    "semester":      ("Semester",     "name"),
+    "course":        ("Course",       "code"),
+    "academic_year": ("AcademicYear", "name"),
+    "class":         ("Class",        "name"),
+    "student":       ("Student",      "student_code"),
+}
+
+
+def _norm(name):
+    return str(name).strip().lower()
+
+
+class DimensionLookup:
+    """Tra tên -> id cho các bảng danh mục, nạp một lần cho cả lượt ghi."""
+
+    def __init__(self, conn):
+        self.maps = {}
+        for dim, (table, col) in DIMENSIONS.items():
+            rows = conn.execute(f"SELECT id, {col} FROM {table}").fetchall()
+            self.maps[dim] = {_norm(name): id_ for id_, name in rows if name is not None}
+        # lớp -> năm học, sinh viên -> lớp: điền các cột còn thiếu
+        self.class_year    = dict(conn.execute("SELECT id, academic_year_id FROM Class").fetchall())
+        self.student_class = dict(conn.execute("SELECT id, class_id FROM Student").fetchall())
+
+    def id(self, dim, name):
+        return None if name is None else self.maps[dim].get(_norm(name))
+
+    def tags(self, semester=None, course_code=None, academic_year=None, class_name=None, student_code=None):
+        """(semester_id, course_id, academic_year_id, class_id, student_id) cho một bộ nhãn."""
+        student_id = self.id("student", student_code)
+        class_id   = self.id("class", class_name) or self.student_class.get(student_id)
+        year_id    = self.id("academic_year", academic_year) or self.class_year.get(class_id)
+        return self.id("semester", semester), self.id("course", course_code), year_id, class_id, student_id
+
+
+def insert_sentences(conn, rows, chunk_size=INGEST_CHUNK_SIZE, lookup=None, ids=None, commit=True):
+    """Ghi các dòng (text, aspect, sentiment, semester, course_code, academic_year, class_name, student_code)
+    — cùng thứ tự tham số với utils.insert_sentence. Tên không có trong danh mục được ghi NULL.
+
+    `ids`: id cố định cho từng dòng (ghi bằng INSERT OR IGNORE nên chạy lại không bị trùng);
+    mặc định uuid4. `commit=False`: không tự commit, để caller gộp vào transaction của mình.
+    Trả về (số dòng đã ghi, số dòng có aspect/sentiment không tra được).
+    """
+    lookup = lookup or DimensionLookup(conn)
+    sql    = INSERT_SENTENCE_SQL.replace("INSERT", "INSERT OR IGNORE", 1) if ids is not None else INSERT_SENTENCE_SQL
+    ids    = iter(ids) if ids is not None else None
+    tag_ids = {}
+    inserted = unresolved = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if commit:
+            with conn:   # một transaction cho mỗi chunk
+                inserted += conn.executemany(sql, batch).rowcount
+        else:
+            inserted += conn.executemany(sql, batch).rowcount
+        batch.clear()
+
+    for text, aspect, sentiment, *tags in rows:
+        tags = tuple(tags) + (None,) * (5 - len(tags))
+        if tags not in tag_ids:
+            tag_ids[tags] = lookup.tags(*tags)
+        asp_id, sen_id = lookup.id("aspect", aspect), lookup.id("sentiment", sentiment)
+        unresolved += asp_id is None or sen_id is None
+        row_id = next(ids) if ids is not None else str(uuid.uuid4())
+        batch.append((row_id, text, asp_id, sen_id) + tag_ids[tags])
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+    return inserted, unresolved
+
+
+def result_rows(results, semester=None, course_code=None, academic_year=None, class_name=None, student_code=None):
+    """Dòng cho insert_sentences từ các (text, [(aspect, sentiment), ...]); câu không có cặp nào bị bỏ."""
+    tags = (semester, course_code, academic_year, class_name, student_code)
+    for text, pairs in results:
+        for aspect, sentiment in pairs:
+            yield (text, aspect, sentiment) + tags
+
+
+def save_results(conn, results, **tags):
+    """Ghi kết quả một file với cùng bộ nhãn; trả về (số dòng, số dòng không tra được, giây)."""
+    start = time.perf_counter()
+    inserted, unresolved = insert_sentences(conn, result_rows(results, **tags))
+    return inserted, unresolved, time.perf_counter() - start
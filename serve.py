@@ -0,0 +1,158 @@
+# serve.py
+"""Chế độ chạy production cho Flask host: pre-fork nhiều worker dùng chung trọng số model.
+
+Process cha nạp (và warmup) các model một lần, mở socket lắng nghe rồi fork N worker.
+Trọng số được chia sẻ copy-on-write giữa các worker nên bộ nhớ PhoBERT không nhân N lần.
+Mỗi worker có `torch.set_num_threads(threads_per_worker)` riêng để không tranh nhau core.
+Các worker nhận kết nối trên cùng socket nên job nền được lưu trong SQLite dùng chung (JOB_DB).
+
+Ví dụ:
+    python serve.py --workers 4 --threads-per-worker 2 --port 5000
+"""
+import os
+import gc
+import sys
+import time
+import signal
+import socket
+import argparse
+
+
+def parse_args():
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Pre-fork server cho flask_api_multi_model_host")
+    parser.add_argument("--host", default=os.environ.get("SERVE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("SERVE_PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", 0)),
+                        help="Số worker (mặc định: số core / threads-per-worker)")
+    parser.add_argument("--threads-per-worker", type=int,
+                        default=int(os.environ.get("SERVE_THREADS_PER_WORKER", 0)),
+                        help="torch.set_num_threads cho mỗi worker (mặc định: số core / workers)")
+    parser.add_argument("--models", nargs="*", default=None,
+                        help="Model nạp trước khi fork (mặc định: tất cả model trong models.json)")
+    parser.add_argument("--no-preload", action="store_true",
+                        help="Không nạp model ở process cha (mỗi worker tự nạp khi cần)")
+    parser.add_argument("--job-db", default=os.environ.get("JOB_DB", "jobs.db"),
+                        help="File SQLite lưu job nền, dùng chung giữa các worker")
+    parser.add_argument("--stub-models", action="store_true",
+                        help="Dùng model giả chi phí cố định thay cho model thật (xem STUB_BATCH_MS)")
+    args = parser.parse_args()
+
+    if not args.workers and not args.threads_per_worker:
+        args.threads_per_worker = 1
+    if not args.workers:
+        args.workers = max(1, cpus // args.threads_per_worker)
+    if not args.threads_per_worker:
+        args.threads_per_worker = max(1, cpus // args.workers)
+    return args
+
+
+def open_listener(host, port, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(index, sock, args):
+    import torch
+    from werkzeug.serving import make_server
+    import flask_api_multi_model_host as host
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    torch.set_num_threads(args.threads_per_worker)
+    host.registry.start_sweeper()
+
+    server = make_server(args.host, args.port, host.app, threaded=True, fd=sock.fileno())
+    print(f"[worker {index}] pid={os.getpid()} threads={args.threads_per_worker}", flush=True)
+    server.serve_forever()
+
+
+def spawn(index, sock, args):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(index, sock, args)
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def main():
+    args = parse_args()
+    os.environ.setdefault("OMP_NUM_THREADS", str(args.threads_per_worker))
+    if args.stub_models:
+        os.environ["STUB_MODELS"] = "1"
+    # job trong bộ nhớ của một worker không thấy được từ worker khác
+    if args.job_db:
+        os.environ["JOB_DB"] = args.job_db
+    elif args.workers > 1:
+        sys.exit("serve.py: --job-db là bắt buộc khi chạy nhiều worker")
+
+    import torch
+    import flask_api_multi_model_host as host
+
+    if host.device.type == "cuda" and not args.no_preload:
+        # CUDA không an toàn sau fork: để mỗi worker tự nạp model
+        print("CUDA detected: models will be loaded inside each worker", flush=True)
+        args.no_preload = True
+
+    if not args.no_preload:
+        # nạp một thread để warmup không sinh thêm thread pool trước khi fork
+        torch.set_num_threads(1)
+        for name in args.models if args.models is not None else host.registry.names():
+            start = time.perf_counter()
+            host.registry.get(name)
+            print(f"[master] loaded {name} in {time.perf_counter() - start:.1f}s", flush=True)
+
+    # đưa các object hiện có ra khỏi GC để worker không chạm (và copy) các trang bộ nhớ đó
+    gc.collect()
+    gc.freeze()
+
+    sock    = open_listener(args.host, args.port)
+    workers = {spawn(i, sock, args): i for i in range(args.workers)}
+    print(f"[master] pid={os.getpid()} serving on {args.host}:{args.port} "
+          f"with {args.workers} workers x {args.threads_per_worker} threads", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = workers.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"[master] worker {index} (pid={pid}) exited with {status}, restarting", flush=True)
+        time.sleep(1)
+        workers[spawn(index, sock, args)] = index
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
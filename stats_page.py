@@ -1,12 +1,53 @@
+import os
+
 import streamlit as st
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import plotly.express as px
 from matplotlib.colors import to_hex
 import numpy as np
 
-from utils import get_lists, create_connection
+from utils import get_lists
+from stats_queries import data_version, load_labels, value_counts, crosstab, raw_rows
+
+RAW_PAGE_SIZE       = 100
+STATS_CACHE_ENTRIES = int(os.environ.get("STATS_CACHE_ENTRIES", 512))
+
+# ==== Cache kết quả truy vấn, dùng chung mọi phiên ====
+def filter_lists(conn):
+    """Các lựa chọn cho bộ lọc sidebar."""
+    courses = conn.execute("SELECT code, name FROM Course").fetchall()
+    return {
+        "aspect":    get_lists(conn, "Aspect"),
+        "sentiment": get_lists(conn, "Sentiment"),
+        "semester":  get_lists(conn, "Semester")[:8],
+        "class":     get_lists(conn, "Class")[:8],
+        "course":    [f"{code} – {name}" for code, name in courses],
+    }
+
+QUERIES = {"lists": filter_lists, "labels": load_labels, "value_counts": value_counts,
+           "crosstab": crosstab, "raw_rows": raw_rows}
+
+@st.cache_data(max_entries=STATS_CACHE_ENTRIES, show_spinner=False)
+def cached_query(_db, db_file, version, name, *args):
+    """Kết quả QUERIES[name](*args) theo (file DB, DataVersion); chỉ chạy SQL khi chưa có trong cache.
+    DataVersion đổi khi có ghi nên khoá cũ không còn được dùng nữa."""
+    labels = None if name in ("lists", "labels") else cached_query(_db, db_file, version, "labels")
+    with _db.reader() as conn:
+        if labels is None:
+            return QUERIES[name](conn, *args)
+        return QUERIES[name](conn, *args, labels=labels)
+
+class DashboardData:
+    """Truy vấn của một lần chạy trang: đọc DataVersion một lần, còn lại lấy từ cache."""
+
+    def __init__(self, db):
+        self.db = db
+        with db.reader() as conn:
+            self.version = data_version(conn)
+
+    def __call__(self, name, *args):
+        return cached_query(self.db, self.db.db_file, self.version, name, *args)
 
 # ==== Hàm lấy palette động đủ dài ====
 def get_palette_hex(n, palette_name="Set2"):
@@ -26,36 +67,22 @@ def get_palette_hex(n, palette_name="Set2"):
 def get_bright_palette_hex(n):
     return get_palette_hex(n, palette_name="bright")
 
-def stats_page(conn):
+def stats_page(db):
     # --- Style chung ---
     sns.set_style("whitegrid")
     plt.rcParams['font.family'] = 'DejaVu Sans'
 
-    # --- Load dữ liệu ---
-    sql = """
-    SELECT S.text,
-           A.name    AS aspect,
-           Sen.name  AS sentiment,
-           Sem.name  AS semester,
-           Cou.code||' – '||Cou.name AS course,
-           Cl.name   AS class
-    FROM Sentence S
-      LEFT JOIN Aspect    A   ON S.aspect_id    = A.id
-      LEFT JOIN Sentiment Sen ON S.sentiment_id = Sen.id
-      LEFT JOIN Semester  Sem ON S.semester_id  = Sem.id
-      LEFT JOIN Course    Cou ON S.course_id    = Cou.id
-      LEFT JOIN Class     Cl  ON S.class_id     = Cl.id
-    """
-    df_full = pd.read_sql_query(sql, conn)
+    # --- Dữ liệu: dữ liệu không đổi thì lấy từ cache, không chạy SQL ---
+    data = DashboardData(db)
 
     # --- Sidebar chung ---
     st.sidebar.header("Bộ lọc chung")
-    aspects_all    = get_lists(conn, "Aspect")
-    sentiments_all = get_lists(conn, "Sentiment")
-    semesters_all  = get_lists(conn, "Semester")[:8]
-    classes_all    = get_lists(conn, "Class")[:8]
-    courses_raw    = conn.execute("SELECT code, name FROM Course").fetchall()
-    courses_all    = [f"{c[0]} – {c[1]}" for c in courses_raw]
+    lists          = data("lists")
+    aspects_all    = lists["aspect"]
+    sentiments_all = lists["sentiment"]
+    semesters_all  = lists["semester"]
+    classes_all    = lists["class"]
+    courses_all    = lists["course"]
 
     sel_aspects   = st.sidebar.multiselect("Khía cạnh", aspects_all,    default=aspects_all)
     sel_sents     = st.sidebar.multiselect("Cảm xúc",   sentiments_all, default=sentiments_all)
@@ -88,28 +115,26 @@ def stats_page(conn):
     css += "</style>"
     st.markdown(css, unsafe_allow_html=True)
 
-    # --- Áp dụng bộ lọc chung ---
-    df1 = df_full[
-        df_full['aspect'].isin(sel_aspects) &
-        df_full['sentiment'].isin(sel_sents) &
-        df_full['semester'].isin(sel_semesters) &
-        df_full['course'].isin(sel_courses) &
-        df_full['class'].isin(sel_classes)
-    ]
+    # --- Áp dụng bộ lọc chung: chỉ lấy số đếm đã gom nhóm ---
+    filters = {"aspect": sel_aspects, "sentiment": sel_sents, "semester": sel_semesters,
+               "course": sel_courses, "class": sel_classes}
+    sen_counts = data("value_counts", "sentiment", filters)
+    asp_counts = data("value_counts", "aspect", filters)
+    total      = int(sen_counts.sum())
 
     st.header("📈 Thống kê chi tiết")
     st.markdown("Phân tích dữ liệu câu phản hồi theo nhiều chiều.")
-    st.write(f"### Tổng cộng {len(df1)} câu sau khi áp dụng bộ lọc chung")
-    if df1.empty:
+    st.write(f"### Tổng cộng {total} câu sau khi áp dụng bộ lọc chung")
+    if total == 0:
         st.warning("Không có dữ liệu sau khi áp dụng lọc chung.")
         return
     if st.checkbox("Hiển thị dữ liệu gốc (lọc chung)"):
-        st.dataframe(df1)
+        pages = (total + RAW_PAGE_SIZE - 1) // RAW_PAGE_SIZE
+        page  = st.number_input(f"Trang (1–{pages})", min_value=1, max_value=pages, value=1, key="raw_page")
+        st.dataframe(data("raw_rows", filters, RAW_PAGE_SIZE, (page - 1) * RAW_PAGE_SIZE))
 
     # --- Section 1: Pie & Bar cơ bản (giữ nguyên) ---
     st.markdown("---")
-    sen_counts = df1['sentiment'].value_counts()
-    asp_counts = df1['aspect'].value_counts()
     sen_palette = get_palette_hex(len(sen_counts))
     asp_palette = get_palette_hex(len(asp_counts))
 
@@ -159,14 +184,12 @@ def stats_page(conn):
         ca_cou = st.selectbox("Môn (cross)",   ["Tất cả"] + courses_all,   key="ca_cou")
         ca_cla = st.selectbox("Lớp (cross)",   ["Tất cả"] + classes_all,   key="ca_cla")
 
-    df2 = df_full.copy()
-    if ca_sem != "Tất cả": df2 = df2[df2['semester'] == ca_sem]
-    if ca_cou != "Tất cả": df2 = df2[df2['course']   == ca_cou]
-    if ca_cla != "Tất cả": df2 = df2[df2['class']    == ca_cla]
+    ca_filters = {"semester": ca_sem, "course": ca_cou, "class": ca_cla}
+    ca_filters = {k: v for k, v in ca_filters.items() if v != "Tất cả"}
 
     dim  = st.selectbox("Chọn chiều X",
                         ['aspect', 'semester', 'course', 'class'], index=0)
-    grp  = df2.groupby([dim, 'sentiment']).size().unstack(fill_value=0)
+    grp  = data("crosstab", dim, 'sentiment', ca_filters)
 
     if grp.empty:
         st.info("Không đủ dữ liệu.")
@@ -188,15 +211,14 @@ def stats_page(conn):
         tr_cla    = st.selectbox("Lớp", ["Tất cả"] + classes_all,     key="tr_cla")
     asp_tr = st.selectbox("Chọn khía cạnh (trend)", aspects_all, key="tr_asp")
 
-    df3 = df_full.copy()
-    if tr_course != "Tất cả": df3 = df3[df3['course'] == tr_course]
-    if tr_cla   != "Tất cả": df3 = df3[df3['class']  == tr_cla]
-    df_tr = df3[df3['aspect'] == asp_tr]
+    tr_filters = {"course": tr_course, "class": tr_cla}
+    tr_filters = {k: v for k, v in tr_filters.items() if v != "Tất cả"}
+    trend = data("crosstab", 'semester', 'sentiment', dict(tr_filters, aspect=asp_tr))
 
-    if df_tr.empty:
+    if trend.empty:
         st.info("Không đủ dữ liệu trend.")
     else:
-        trend = df_tr.groupby(['semester', 'sentiment']).size().unstack(fill_value=0).reset_index()
+        trend = trend.reset_index()
         if trend.shape[0] > 1:
             # melt thành long form để dễ map màu
             trend_melt = trend.melt(id_vars='semester', var_name='sentiment', value_name='count')
@@ -0,0 +1,114 @@
+# stats_queries.py
+"""Truy vấn cho trang thống kê: lọc và đếm ngay trong SQL, chỉ trả về số đếm đã gom nhóm.
+
+Bộ lọc là dict chiều -> nhãn (hoặc list nhãn) như trên giao diện; nhãn được đổi sang id
+bằng các bảng danh mục (nhỏ) rồi lọc trên cột *_id. Số đếm mặc định đọc từ bảng tổng hợp
+SentenceRollup (rollup.py) nên chỉ phụ thuộc số nhóm, không phụ thuộc số câu.
+"""
+import os
+
+import pandas as pd
+
+# "rollup": đếm trên SentenceRollup; "sentence": COUNT(*) trực tiếp trên Sentence
+STATS_SOURCE = os.environ.get("STATS_SOURCE", "rollup")
+COUNT_SOURCES = {"rollup": ("SentenceRollup", "SUM(n)"), "sentence": ("Sentence", "COUNT(*)")}
+
+# chiều -> (cột trong Sentence, bảng danh mục, biểu thức nhãn hiển thị)
+DIMS = {
+    "aspect":    ("aspect_id",    "Aspect",    "name"),
+    "sentiment": ("sentiment_id", "Sentiment", "name"),
+    "semester":  ("semester_id",  "Semester",  "name"),
+    "course":    ("course_id",    "Course",    "code||' – '||name"),
+    "class":     ("class_id",     "Class",     "name"),
+}
+
+
+def data_version(conn):
+    """Bộ đếm ghi DataVersion (tăng bởi trigger khi Sentence hoặc danh mục đổi); khoá cache của trang thống kê."""
+    return conn.execute("SELECT version FROM DataVersion WHERE id = 1").fetchone()[0]
+
+
+def load_labels(conn):
+    """{chiều: {id: nhãn}} cho mọi chiều của DIMS."""
+    return {dim: dict(conn.execute(f"SELECT id, {label} FROM {table}").fetchall())
+            for dim, (_, table, label) in DIMS.items()}
+
+
+def build_where(filters, labels):
+    """(mệnh đề WHERE, tham số) từ bộ lọc; None nếu bộ lọc chắc chắn không khớp dòng nào.
+
+    Giá trị là list: giữ các dòng có nhãn trong list (list rỗng = không dòng nào);
+    là một nhãn: so khớp đúng nhãn đó; None: không lọc chiều này.
+    """
+    clauses, params = [], []
+    for dim, value in (filters or {}).items():
+        if value is None:
+            continue
+        col = DIMS[dim][0]
+        wanted = set(value) if isinstance(value, (list, tuple, set)) else {value}
+        ids = [i for i, name in labels[dim].items() if name in wanted]
+        if not ids:
+            return None, []
+        clauses.append(f"{col} IN ({', '.join('?' * len(ids))})")
+        params += ids
+    return " AND ".join(clauses) or "1", params
+
+
+def count_sql(group, filters, labels, source=None):
+    """(sql, tham số) đếm số câu theo `group`; (None, []) nếu bộ lọc không khớp dòng nào."""
+    table, count = COUNT_SOURCES[source or STATS_SOURCE]
+    cols = [DIMS[d][0] for d in group]
+    where, params = build_where(filters, labels)
+    if where is None:
+        return None, []
+    not_null = " AND ".join(f"{c} IS NOT NULL" for c in cols)
+    return (f"SELECT {', '.join(cols)}, {count} FROM {table} "
+            f"WHERE {where} AND {not_null} GROUP BY {', '.join(cols)}"), params
+
+
+def raw_sql(filters, labels, limit=100, offset=0):
+    where, params = build_where(filters, labels)
+    if where is None:
+        return None, []
+    cols = ", ".join(DIMS[d][0] for d in DIMS)
+    return (f"SELECT text, {cols} FROM Sentence WHERE {where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [limit, offset])
+
+
+def count_by(conn, group, filters=None, labels=None):
+    """DataFrame các cột `group` (nhãn) + `count`; bỏ các dòng có chiều nhóm là NULL như pandas.groupby."""
+    labels = labels or load_labels(conn)
+    sql, params = count_sql(group, filters, labels)
+    if sql is None:
+        return pd.DataFrame(columns=list(group) + ["count"])
+    df = pd.DataFrame(conn.execute(sql, params).fetchall(), columns=list(group) + ["count"])
+    for dim in group:
+        df[dim] = df[dim].map(labels[dim])
+    # id không còn trong bảng danh mục: bỏ, như LEFT JOIN + groupby trước đây
+    return df.dropna(subset=list(group)).reset_index(drop=True)
+
+
+def value_counts(conn, dim, filters=None, labels=None):
+    """Như Series.value_counts(): số câu theo từng nhãn của `dim`, giảm dần."""
+    df = count_by(conn, [dim], filters, labels)
+    return df.set_index(dim)["count"].sort_values(ascending=False, kind="stable").rename(None)
+
+
+def crosstab(conn, index, column, filters=None, labels=None):
+    """Bảng index x column (như groupby([index, column]).size().unstack(fill_value=0))."""
+    df = count_by(conn, [index, column], filters, labels)
+    if df.empty:
+        return pd.DataFrame()
+    return df.pivot(index=index, columns=column, values="count").fillna(0).astype(int).rename_axis(columns=column)
+
+
+def raw_rows(conn, filters=None, limit=100, offset=0, labels=None):
+    """Một trang các câu gốc (text, aspect, sentiment, semester, course, class) khớp bộ lọc."""
+    labels = labels or load_labels(conn)
+    sql, params = raw_sql(filters, labels, limit, offset)
+    if sql is None:
+        return pd.DataFrame(columns=["text"] + list(DIMS))
+    df = pd.DataFrame(conn.execute(sql, params).fetchall(), columns=["text"] + list(DIMS))
+    for dim in DIMS:
+        df[dim] = df[dim].map(labels[dim])
+    return df
@@ -1,11 +1,16 @@
 import sqlite3
 import uuid
-import requests
+import json
 import streamlit as st
 import random
 
+from api_client import PredictionClient, API_BASE
+from database import ConnectionManager
+from rollup import create_rollup
+
 DB_NAME = "aspect_sa.db"
-API_URL = "http://localhost:5000/predict"
+# Tên model trên giao diện -> tên model trong registry của Flask host
+JOB_MODELS = {"PhoBert_CNN_LSTM": "phobert", "CNN_LSTM_ATTENTION": "cnn", "CASCADE": "cascade"}
 
 # ======================= DATABASE UTILS =======================
 
@@ -16,6 +21,11 @@ def create_connection(db_file=DB_NAME):
     except sqlite3.Error as e:
         st.error(f"Lỗi kết nối DB: {e}")
 
+@st.cache_resource(show_spinner=False)
+def get_db(db_file=DB_NAME):
+    """ConnectionManager dùng chung cho mọi phiên Streamlit: pool kết nối đọc + một kết nối ghi, WAL."""
+    return ConnectionManager(db_file)
+
 def run_sql(conn, sql, params=None, many=False):
     """Thực thi câu lệnh SQL."""
     try:
@@ -28,10 +38,18 @@ def run_sql(conn, sql, params=None, many=False):
     except sqlite3.Error as e:
         st.error(f"Lỗi SQL: {e}")
 
+def migration_sql(conn, sql, params=None, many=False):
+    """Thực thi câu lệnh trong migration: không commit (create_database commit cả migration
+    cùng user_version) và không nuốt lỗi, để migration lỗi được rollback và chạy lại lần sau."""
+    if many:
+        conn.executemany(sql, params)
+    else:
+        conn.execute(sql, params or ())
+
 # ======================= TẠO BẢNG =======================
 
 def create_aspect_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Aspect (
         id   INTEGER PRIMARY KEY,
         name TEXT NOT NULL UNIQUE
@@ -39,7 +57,7 @@ def create_aspect_table(conn):
     """)
 
 def create_sentiment_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Sentiment (
         id   INTEGER PRIMARY KEY,
         name TEXT NOT NULL UNIQUE
@@ -47,7 +65,7 @@ def create_sentiment_table(conn):
     """)
 
 def create_semester_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Semester (
         id         INTEGER PRIMARY KEY AUTOINCREMENT,
         name       TEXT NOT NULL UNIQUE,
@@ -57,7 +75,7 @@ def create_semester_table(conn):
     """)
 
 def create_course_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Course (
         id   INTEGER PRIMARY KEY AUTOINCREMENT,
         code TEXT NOT NULL UNIQUE,
@@ -66,7 +84,7 @@ def create_course_table(conn):
     """)
 
 def create_academic_year_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS AcademicYear (
         id         INTEGER PRIMARY KEY AUTOINCREMENT,
         name       TEXT NOT NULL UNIQUE,
@@ -76,7 +94,7 @@ def create_academic_year_table(conn):
     """)
 
 def create_class_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Class (
         id                 INTEGER PRIMARY KEY AUTOINCREMENT,
         name               TEXT NOT NULL,
@@ -87,7 +105,7 @@ def create_class_table(conn):
     """)
 
 def create_student_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Student (
         id           INTEGER PRIMARY KEY AUTOINCREMENT,
         student_code TEXT NOT NULL UNIQUE,
@@ -98,7 +116,7 @@ def create_student_table(conn):
     """)
 
 def create_sentence_table(conn):
-    run_sql(conn, """
+    migration_sql(conn, """
     CREATE TABLE IF NOT EXISTS Sentence (
         id                TEXT PRIMARY KEY,
         text              TEXT NOT NULL,
@@ -119,6 +137,53 @@ def create_sentence_table(conn):
     );
     """)
 
+def create_import_checkpoint_table(conn):
+    # checkpoint của data_insert.py: mỗi lượt nhập một dòng
+    migration_sql(conn, """
+    CREATE TABLE IF NOT EXISTS ImportCheckpoint (
+        name        TEXT PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        model       TEXT NOT NULL,
+        rows_done   INTEGER NOT NULL,
+        inserted    INTEGER NOT NULL,
+        finished    INTEGER NOT NULL DEFAULT 0,
+        updated_at  TEXT NOT NULL
+    );
+    """)
+
+def create_sentence_indexes(conn):
+    # theo cách trang thống kê lọc/gom nhóm (xem stats_queries.py và check_query_plans.py):
+    # hai index phủ (covering) cho bộ lọc chung và cho lọc theo môn/lớp, thêm index đơn cho học kỳ/lớp/sinh viên
+    for sql in [
+        "CREATE INDEX IF NOT EXISTS idx_sentence_aspect_sentiment_semester "
+        "ON Sentence (aspect_id, sentiment_id, semester_id, course_id, class_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sentence_course_class "
+        "ON Sentence (course_id, class_id, semester_id, aspect_id, sentiment_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sentence_semester ON Sentence (semester_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sentence_class    ON Sentence (class_id)",
+        "CREATE INDEX IF NOT EXISTS idx_sentence_student  ON Sentence (student_id)",
+    ]:
+        migration_sql(conn, sql)
+
+# bảng danh mục mà trang thống kê hiển thị; thay đổi ở đây hoặc ở Sentence đều tăng DataVersion
+DATA_VERSION_TABLES = ("Sentence", "Aspect", "Sentiment", "Semester", "Course", "Class")
+
+def create_data_version(conn):
+    # bộ đếm ghi một dòng: trigger tăng mỗi khi dữ liệu thống kê đổi, từ bất kỳ kết nối/tiến trình nào;
+    # trang thống kê dùng làm khoá cache (xem stats_page.py)
+    migration_sql(conn, """
+    CREATE TABLE IF NOT EXISTS DataVersion (
+        id      INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    );""")
+    migration_sql(conn, "INSERT OR IGNORE INTO DataVersion (id, version) VALUES (1, 0)")
+    for table in DATA_VERSION_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            migration_sql(conn, f"""
+            CREATE TRIGGER IF NOT EXISTS trg_data_version_{table.lower()}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN UPDATE DataVersion SET version = version + 1 WHERE id = 1; END;""")
+
 # ======================= INSERT DỮ LIỆU MẪU =======================
 
 def insert_aspect_data(conn):
@@ -132,7 +197,7 @@ def insert_aspect_data(conn):
         (7, "Test and evaluation"),
         (8, "General review")
     ]
-    run_sql(conn, "INSERT OR IGNORE INTO Aspect (id, name) VALUES (?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Aspect (id, name) VALUES (?, ?)", data, many=True)
 
 def insert_sentiment_data(conn):
     data = [
@@ -140,14 +205,14 @@ def insert_sentiment_data(conn):
         (1, "Neutral"),
         (2, "Positive")
     ]
-    run_sql(conn, "INSERT OR IGNORE INTO Sentiment (id, name) VALUES (?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Sentiment (id, name) VALUES (?, ?)", data, many=True)
 
 def insert_semester_data(conn):
     data = []
     for year in range(2020, 2026):
         data.append((f"{year}HK1", f"{year}-01-01", f"{year}-05-31"))
         data.append((f"{year}HK2", f"{year}-08-01", f"{year}-12-31"))
-    run_sql(conn, "INSERT OR IGNORE INTO Semester (name, start_date, end_date) VALUES (?, ?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Semester (name, start_date, end_date) VALUES (?, ?, ?)", data, many=True)
 
 def insert_course_data(conn):
     data = [
@@ -158,13 +223,13 @@ def insert_course_data(conn):
         ("WEB505", "Phát triển Ứng dụng Web"),
         ("NET606", "Mạng Máy tính")
     ]
-    run_sql(conn, "INSERT OR IGNORE INTO Course (code, name) VALUES (?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Course (code, name) VALUES (?, ?)", data, many=True)
 
 def insert_academic_year_data(conn):
     data = []
     for start in range(2020, 2025):
         data.append((f"{start}-{start+1}", start, start+1))
-    run_sql(conn, "INSERT OR IGNORE INTO AcademicYear (name, start_year, end_year) VALUES (?, ?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO AcademicYear (name, start_year, end_year) VALUES (?, ?, ?)", data, many=True)
 
 def insert_class_data(conn):
     # Lấy tất cả năm học để gán class mẫu
@@ -175,7 +240,7 @@ def insert_class_data(conn):
         for i, char in enumerate(['A', 'B']):
             class_name = f"K{k_number}{char}"
             data.append((class_name, year_id))
-    run_sql(conn, "INSERT OR IGNORE INTO Class (name, academic_year_id) VALUES (?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Class (name, academic_year_id) VALUES (?, ?)", data, many=True)
 
 # ========= DANH SÁCH TÊN VIỆT NAM NGẪU NHIÊN CHO 200 SINH VIÊN ==========
 
@@ -230,16 +295,11 @@ def insert_student_data(conn):
             name = names[student_idx]
             data.append((code, name, class_id))
             student_idx += 1
-    run_sql(conn, "INSERT OR IGNORE INTO Student (student_code, name, class_id) VALUES (?, ?, ?)", data, many=True)
+    migration_sql(conn, "INSERT OR IGNORE INTO Student (student_code, name, class_id) VALUES (?, ?, ?)", data, many=True)
 
 # ======================= TẠO DATABASE CHUNG =======================
 
-def create_database(db_file=DB_NAME):
-    conn = create_connection(db_file)
-    if not conn:
-        st.error("Không thể kết nối DB")
-        return
-
+def migrate_base_schema(conn):
     # Tạo bảng theo thứ tự dependencies
     create_aspect_table(conn)
     create_sentiment_table(conn)
@@ -259,26 +319,99 @@ def create_database(db_file=DB_NAME):
     insert_class_data(conn)
     insert_student_data(conn)
 
-    conn.close()
+# Migration theo thứ tự; phiên bản schema = số migration đã chạy, lưu trong PRAGMA user_version.
+# Chỉ thêm vào cuối danh sách, không sửa migration đã phát hành. Mọi migration đều idempotent
+# (IF NOT EXISTS / OR IGNORE) nên DB tạo trước khi có versioning cũng nâng cấp được.
+MIGRATIONS = [
+    migrate_base_schema,
+    create_import_checkpoint_table,
+    create_sentence_indexes,
+    create_rollup,
+    create_data_version,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def create_database(db_file=DB_NAME):
+    """Tạo/nâng cấp schema đúng một lần cho mỗi DB; các lần sau chỉ đọc PRAGMA user_version."""
+    conn = create_connection(db_file)
+    if not conn:
+        st.error("Không thể kết nối DB")
+        return
+
+    # tự quản lý transaction: mỗi migration và lệnh tăng user_version nằm trong cùng một transaction
+    conn.isolation_level = None
+    try:
+        version = schema_version(conn)
+        for v in range(version, SCHEMA_VERSION):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                MIGRATIONS[v](conn)
+                conn.execute(f"PRAGMA user_version = {v + 1}")
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                st.error(f"Lỗi migration {v + 1} ({MIGRATIONS[v].__name__}): {e}")
+                raise
+    finally:
+        conn.close()
 
 # ======================= HÀM HỖ TRỢ CHUNG =======================
 
 @st.cache_resource(show_spinner=False)
+def get_client():
+    """Một PredictionClient (Session keep-alive + cache LRU) dùng chung cho mọi phiên Streamlit."""
+    return PredictionClient(API_BASE)
+
 def get_predictions(text: str, model="PhoBert_CNN_LSTM"):
     try:
-        model_api_endpoint = None
-        if model == "PhoBert_CNN_LSTM":
-            model_api_endpoint = "http://localhost:5000/predict_pho"
-        elif model == "CNN_LSTM_ATTENTION":
-            model_api_endpoint = "http://localhost:5000/predict_cnn"
-        resp = requests.post(model_api_endpoint, json={"text": text})
-        resp.raise_for_status()
-        data = resp.json()
-        return [(it["aspect"], it["sentiment"]) for it in data.get("predictions", [])]
+        return get_client().predict(text, model)
     except Exception as e:
         st.error(f"Lỗi khi gọi API: {e}")
         return []
 
+def start_predictions_many(texts, model="PhoBert_CNN_LSTM"):
+    """Phân tích nhiều câu ở thread nền (api_client.BatchRun): trang không bị chặn và có thể dừng ngay."""
+    return get_client().start_many(texts, model)
+
+# ======================= JOB PHÂN TÍCH FILE =======================
+
+def submit_job(lines, model="PhoBert_CNN_LSTM"):
+    """Gửi file (danh sách dòng) lên Flask host để phân tích nền, trả về thông tin job."""
+    try:
+        # không retry: tạo job không idempotent
+        resp = get_client().request("POST", "/jobs", retry=False,
+                                    json={"model": JOB_MODELS[model], "lines": lines}, timeout=30)
+        return resp.json()
+    except Exception as e:
+        st.error(f"Lỗi khi tạo job: {e}")
+        return None
+
+def get_job(job_id):
+    try:
+        return get_client().request("GET", f"/jobs/{job_id}", timeout=10).json()
+    except Exception as e:
+        st.error(f"Lỗi khi lấy trạng thái job: {e}")
+        return None
+
+def get_job_results(job_id, offset=0):
+    """Danh sách (text, [(aspect, sentiment), ...]) đã có của job, bắt đầu từ `offset`."""
+    try:
+        resp = get_client().request("GET", f"/jobs/{job_id}/results", params={"offset": offset}, timeout=60)
+        rows = [json.loads(l) for l in resp.iter_lines(decode_unicode=True) if l]
+        return [(r["text"], [(p["aspect"], p["sentiment"]) for p in r["predictions"]]) for r in rows]
+    except Exception as e:
+        st.error(f"Lỗi khi lấy kết quả job: {e}")
+        return []
+
+def cancel_job(job_id):
+    try:
+        get_client().request("DELETE", f"/jobs/{job_id}", timeout=10)
+    except Exception as e:
+        st.error(f"Lỗi khi dừng job: {e}")
+
 def get_id(conn, table, key_col, key_val):
     cur = conn.cursor()
     cur.execute(f"SELECT id FROM {table} WHERE {key_col}=?", (key_val,))